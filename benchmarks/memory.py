@@ -0,0 +1,35 @@
+import gc
+import logging
+import random
+import tracemalloc
+
+import fire
+
+from models.person import PersonFactory
+
+logger = logging.getLogger(__name__)
+
+ARCHETYPES = {
+    "student": PersonFactory.create_people_with_route_student,
+    "worker": PersonFactory.create_people_with_route_worker,
+    "worker-student": PersonFactory.create_people_with_route_worker_student,
+    "stay-home": PersonFactory.create_people_with_route_stay_home
+}
+
+
+def bytes_per_person(people: int = 10000, seed: int = 0):
+    rows = []
+    for archetype, create_people in ARCHETYPES.items():
+        gc.collect()
+        tracemalloc.start()
+        population = create_people(k=people, rng=random.Random(seed))
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append(f"{archetype:>15}: {current / people:9.1f} bytes/person (peak {peak / people:9.1f})")
+        del population
+    return "\n".join(rows)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    fire.Fire(bytes_per_person)
@@ -0,0 +1,49 @@
+import logging
+import multiprocessing
+import tempfile
+import time
+from typing import List
+
+import fire
+
+from core import Simulator
+from settings import *
+
+logger = logging.getLogger(__name__)
+
+
+def measure(simulations: int = 16, days: int = 10, njobs=None, backend: str = SOCIAL_DISTANCING_VAR_BACKEND,
+            chunksize: int = 1, engine: str = SOCIAL_DISTANCING_VAR_ENGINE) -> List[dict]:
+    cpus = multiprocessing.cpu_count()
+    # Fire parses "--njobs 1,2,4" as a tuple; by default scale through the powers of two up to the cpu count.
+    workers = [njobs] if isinstance(njobs, int) else list(njobs) if njobs else \
+        sorted({1, *[2 ** i for i in range(1, cpus.bit_length())], cpus})
+    rows = []
+    for n in workers:
+        with tempfile.TemporaryDirectory() as output_path:
+            simulator = Simulator(simulations=simulations, njobs=n, backend=backend, chunksize=chunksize)
+            start = time.perf_counter()
+            simulator.run(days=days, output_path=output_path, engine=engine)
+            elapsed = time.perf_counter() - start
+        rows.append({"njobs": n, "seconds": elapsed, "simulations_per_second": simulations / elapsed})
+    for row in rows:
+        row["speedup"] = rows[0]["seconds"] / row["seconds"]
+        row["efficiency"] = row["speedup"] * rows[0]["njobs"] / row["njobs"]
+    return rows
+
+
+def scaling(simulations: int = 16, days: int = 10, njobs=None, backend: str = SOCIAL_DISTANCING_VAR_BACKEND,
+            chunksize: int = 1, engine: str = SOCIAL_DISTANCING_VAR_ENGINE):
+    rows = measure(simulations=simulations, days=days, njobs=njobs, backend=backend, chunksize=chunksize,
+                   engine=engine)
+    return "\n".join(
+        f"njobs={row['njobs']:>3} seconds={row['seconds']:8.2f} "
+        f"simulations/s={row['simulations_per_second']:7.2f} "
+        f"speedup={row['speedup']:5.2f} efficiency={row['efficiency']:4.0%}"
+        for row in rows
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    fire.Fire(scaling)
@@ -0,0 +1,197 @@
+import concurrent.futures
+import datetime
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import fire
+import numpy as np
+
+from benchmarks.simulator import measure
+from catalog import ResultCatalog
+from config import SimulationConfig
+from core import Simulation
+from settings import *
+from storage import confirmed_frame, get_format
+
+logger = logging.getLogger(__name__)
+
+
+def _values(value) -> list:
+    # Fire parses "--populations 1000,10000" as a tuple and a single value as a scalar.
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    # Peak resident set size (KB on linux) of the benchmark process and of the biggest of its (finished) children.
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+def _in_fresh_process(function, **parameters) -> dict:
+    # Each case runs on a fresh interpreter, so its peak memory isn't hidden by the cases measured before it.
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(function, **parameters).result()
+
+
+def simulation_case(population: int, days: int, public_places: float, engine: str, seed: int = 0) -> dict:
+    config = SimulationConfig.default().replace(population=population, factory_num_public=public_places)
+    baseline = _peak_rss_mb()["peak_rss_mb"]
+    start = time.perf_counter()
+    # No early stop: every case simulates the same number of days.
+    simulation = Simulation.from_engine(engine=engine, days=days, seed=seed, config=config, early_stop=False)
+    init_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    simulation.run()
+    run_seconds = time.perf_counter() - start
+    phases = simulation.metrics.summary()["phases"]
+    return {
+        "init_seconds": init_seconds,
+        "run_seconds": run_seconds,
+        **{f"{name}_seconds": seconds for name, seconds in phases.items()},
+        "other_seconds": run_seconds - sum(phases.values()),
+        "baseline_rss_mb": baseline,
+        **_peak_rss_mb()
+    }
+
+
+def simulator_case(njobs: int, simulations: int, days: int, population: int, engine: str) -> dict:
+    # Simulator workers read the population from the environment, set before anything reads it.
+    os.environ["SOCIAL_DISTANCING_VAR_POPULATION"] = str(population)
+    row, = measure(simulations=simulations, days=days, njobs=njobs, engine=engine)
+    return {"seconds": row["seconds"], "simulations_per_second": row["simulations_per_second"], **_peak_rss_mb()}
+
+
+def analyze_case(path: str) -> dict:
+    # pyplot draws off screen: only the aggregation and plotting time is measured, nothing is shown.
+    os.environ["MPLBACKEND"] = "Agg"
+    from main import Main
+    start = time.perf_counter()
+    Main.analyze(simulation_name=path)
+    return {"seconds": time.perf_counter() - start, **_peak_rss_mb()}
+
+
+def _write_runs(path: str, files: int, days: int, output_format: str, seed: int = 0):
+    # Synthetic daily confirmed curves, half of the files per strategy (analyze compares both), cataloged as
+    # simulate-multiple does.
+    rng = np.random.default_rng(seed)
+    result_format = get_format(output_format)
+    runs = []
+    for i in range(files):
+        strategy = SOCIAL_DISTANCING_VAR_STRATEGIES[i % len(SOCIAL_DISTANCING_VAR_STRATEGIES)]
+        os.makedirs(os.path.join(path, strategy), exist_ok=True)
+        infected_cases = np.cumsum(rng.poisson(10, size=days))
+        file_path = os.path.join(path, strategy, f"run-{i}-confirmed{result_format.extension}")
+        result_format.write(confirmed_frame({"time": np.arange(days) * 100 + 99, "infected_cases": infected_cases}),
+                            file_path)
+        runs.append(ResultCatalog.run(f"run-{i}", {"SOCIAL_DISTANCING_VAR_STRATEGY": strategy, "days": days},
+                                      infected_cases, confirmed_path=file_path))
+    ResultCatalog(path).add(runs)
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Suite:
+
+    def __init__(self, output: str = "", seed: int = 0):
+        # Output: json lines file the results are appended to, one line per case.
+        self.output = output
+        self.seed = seed
+        self.commit = _commit()
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+
+    def _record(self, benchmark: str, parameters: dict, metrics: dict) -> dict:
+        row = {
+            "benchmark": benchmark,
+            "parameters": parameters,
+            "metrics": metrics,
+            "commit": self.commit,
+            "started": self.started,
+            "cpus": multiprocessing.cpu_count()
+        }
+        logger.info(json.dumps(row))
+        if self.output:
+            with open(self.output, "a") as file:
+                file.write(json.dumps(row) + "\n")
+        return row
+
+    def simulation(self, populations=(1000, 10000, 50000), days=10, public_places=15,
+                   engines=(SOCIAL_DISTANCING_TAG_ENGINE_PYTHON, SOCIAL_DISTANCING_TAG_ENGINE_NUMPY)) -> List[dict]:
+        # Public places per 100 people: fewer places make bigger groups (quadratic number of interactions).
+        return [
+            self._record("simulation", parameters, _in_fresh_process(simulation_case, seed=self.seed, **parameters))
+            for population, n_days, n_public, engine in itertools.product(
+                _values(populations), _values(days), _values(public_places), _values(engines))
+            for parameters in [{"population": population, "days": n_days, "public_places": n_public,
+                                "engine": engine}]
+        ]
+
+    def simulator(self, njobs=None, simulations: int = 16, days: int = 10, population: int = 1000,
+                  engine: str = SOCIAL_DISTANCING_VAR_ENGINE) -> List[dict]:
+        cpus = multiprocessing.cpu_count()
+        workers = _values(njobs) if njobs else sorted({1, *[2 ** i for i in range(1, cpus.bit_length())], cpus})
+        rows = []
+        for n in workers:
+            parameters = {"njobs": n, "simulations": simulations, "days": days, "population": population,
+                          "engine": engine}
+            metrics = _in_fresh_process(simulator_case, **parameters)
+            metrics["speedup"] = rows[0]["metrics"]["seconds"] / metrics["seconds"] if rows else 1.0
+            rows.append(self._record("simulator", parameters, metrics))
+        return rows
+
+    def analyze(self, files=(10, 100, 1000), days: int = 100,
+                output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT) -> List[dict]:
+        rows = []
+        for n in _values(files):
+            with tempfile.TemporaryDirectory(prefix="benchmark-analyze-") as path:
+                _write_runs(path, files=n, days=days, output_format=output_format, seed=self.seed)
+                parameters = {"files": n, "days": days, "output_format": output_format}
+                rows.append(self._record("analyze", parameters, _in_fresh_process(analyze_case, path=path)))
+        return rows
+
+    def all(self) -> str:
+        rows = [*self.simulation(), *self.simulator(), *self.analyze()]
+        return f"{len(rows)} benchmark cases" + (f" appended to {self.output}" if self.output else "")
+
+    @staticmethod
+    def compare(baseline: str, candidate: str, threshold: float = 0.1) -> str:
+        # Ratio candidate / baseline of every metric of the cases found on both files (last run of each case);
+        # time or memory growing more than "threshold" is flagged.
+        def load(path: str) -> Dict[tuple, dict]:
+            with open(path, "r") as file:
+                rows = [json.loads(line) for line in file if line.strip()]
+            return {(row["benchmark"], json.dumps(row["parameters"], sort_keys=True)): row["metrics"] for row in rows}
+
+        before, after = load(baseline), load(candidate)
+        lines = []
+        for key in sorted(before.keys() & after.keys()):
+            benchmark, parameters = key
+            for metric, value in after[key].items():
+                if not before[key].get(metric) or metric in ["speedup", "simulations_per_second"]:
+                    continue
+                ratio = value / before[key][metric]
+                flag = " REGRESSION" if ratio > 1 + threshold else ""
+                lines.append(f"{benchmark:>10} {parameters} {metric}: {before[key][metric]:10.3f} -> {value:10.3f} "
+                             f"({ratio:5.2f}x){flag}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    fire.Fire(Suite)
@@ -0,0 +1,95 @@
+import os
+import pickle
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from settings import *
+from utils import get_dict_hash_key
+
+
+class ResultCache:
+    # Part of every key: bumped whenever the same configuration and seed simulate something else (e.g. the seed is split
+    # into different random streams), so older entries are never reused.
+    VERSION = 2
+
+    def __init__(self, path: str = SOCIAL_DISTANCING_VAR_CACHE_PATH,
+                 max_size: float = SOCIAL_DISTANCING_VAR_CACHE_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    def __repr__(self):
+        return f"ResultCache(path={self.path}, max_size={self.max_size})"
+
+    @staticmethod
+    def key(dictionary: dict) -> str:
+        return get_dict_hash_key(dictionary={**dictionary, "cache_version": ResultCache.VERSION})
+
+    def _file_path(self, key: str):
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        if not os.path.isdir(self.path):
+            return []
+        entries = []
+        for filename in os.listdir(self.path):
+            if not filename.endswith(".pkl"):
+                continue
+            stat = os.stat(os.path.join(self.path, filename))
+            entries.append((filename[:-len(".pkl")], stat.st_size, stat.st_mtime))
+        # Least recently used first.
+        return sorted(entries, key=lambda entry: entry[2])
+
+    @property
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def get(self, key: str) -> Optional[tuple]:
+        file_path = self._file_path(key)
+        try:
+            with open(file_path, "rb") as file:
+                results = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # The modification time tracks the last use of the entry (LRU).
+        os.utime(file_path)
+        return results
+
+    def put(self, key: str, results: tuple):
+        os.makedirs(self.path, exist_ok=True)
+        # Write to a temporary file first so concurrent workers never read a partial entry.
+        temp_path = os.path.join(self.path, f".{key}-{uuid.uuid4()}.tmp")
+        with open(temp_path, "wb") as file:
+            pickle.dump(results, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self._file_path(key))
+        self.prune()
+
+    def prune(self, max_size: Optional[float] = None) -> List[str]:
+        max_bytes = (max_size if max_size is not None else self.max_size) * 1024 ** 2
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for key, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(self._file_path(key))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(key)
+        return removed
+
+    def clear(self) -> List[str]:
+        return self.prune(max_size=0)
+
+    def describe(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        last_used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entries[-1][2])) if entries else "-"
+        return "\n".join([
+            f"* path: {self.path}",
+            f"* entries: {len(entries)}",
+            f"* size: {total / 1024 ** 2:.2f} MB (max {self.max_size} MB)",
+            f"* last used: {last_used}"
+        ])
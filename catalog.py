@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import get_format_from_filename, read_daily_infected_cases
+
+
+def run_summary(daily_infected_cases: np.ndarray) -> dict:
+    # Summary stats of a run kept on the catalog, from its daily maximum of infected cases.
+    if not len(daily_infected_cases):
+        return {"peak_infected_cases": 0, "peak_day": None, "final_infected_cases": 0}
+    return {
+        "peak_infected_cases": int(daily_infected_cases.max()),
+        "peak_day": int(daily_infected_cases.argmax()),
+        "final_infected_cases": int(daily_infected_cases[-1])
+    }
+
+
+class ResultCatalog:
+    # Index of the runs saved under a simulation directory ("catalog.sqlite" on its root): one row per run with its
+    # strategy, config hash, seed, result files (relative to the directory) and summary stats. Analyze picks the
+    # result files by query instead of walking the whole directory tree.
+    FILENAME = "catalog.sqlite"
+    COLUMNS = {
+        "run_id": "TEXT PRIMARY KEY",
+        "strategy": "TEXT",
+        "config_id": "TEXT",
+        # Seeds go up to 2 ** 64, over the sqlite integers.
+        "seed": "TEXT",
+        "days": "INTEGER",
+        "confirmed_path": "TEXT",
+        "interactions_path": "TEXT",
+        "config_path": "TEXT",
+        "peak_infected_cases": "INTEGER",
+        "peak_day": "INTEGER",
+        "final_infected_cases": "INTEGER",
+        "stopped_at": "INTEGER",
+        "absorbing_state": "TEXT",
+        "created": "REAL"
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file_path = os.path.join(path, self.FILENAME)
+
+    def __repr__(self):
+        return f"ResultCatalog(path={self.path})"
+
+    @property
+    def exists(self) -> bool:
+        return os.path.isfile(self.file_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per call: runs are added by several writer threads (or processes) at once, sqlite locks the
+        # file and waits for the others.
+        os.makedirs(self.path, exist_ok=True)
+        connection = sqlite3.connect(self.file_path, timeout=60)
+        columns = ", ".join(f"{name} {kind}" for name, kind in self.COLUMNS.items())
+        connection.execute(f"CREATE TABLE IF NOT EXISTS runs ({columns})")
+        connection.execute("CREATE INDEX IF NOT EXISTS runs_strategy ON runs (strategy)")
+        connection.execute("CREATE INDEX IF NOT EXISTS runs_config_id ON runs (config_id)")
+        return connection
+
+    def add(self, runs: List[dict]):
+        # Runs given by column, with the paths of their files under the catalog directory; a run added again is
+        # replaced.
+        rows = [
+            [os.path.relpath(run[name], self.path) if name.endswith("_path") and run.get(name) else run.get(name)
+             for name in self.COLUMNS]
+            for run in ({"created": time.time(), **run} for run in runs)
+        ]
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO runs ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in self.COLUMNS)})", rows)
+        finally:
+            connection.close()
+
+    def runs(self, where: str = "", parameters: tuple = ()) -> List[dict]:
+        # E.g. runs("strategy = ? AND peak_infected_cases > ?", ("social-distancing", 100)).
+        if not self.exists:
+            return []
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = connection.execute(f"SELECT * FROM runs{f' WHERE {where}' if where else ''} ORDER BY run_id",
+                                      parameters).fetchall()
+        finally:
+            connection.close()
+        return [dict(row) for row in rows]
+
+    def files(self, kind: str = "confirmed", strategy: Optional[str] = None) -> List[Tuple[str, str]]:
+        # (result file, strategy) of the cataloged runs; a batch file holding several runs is listed once.
+        if not self.exists:
+            return []
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                f"SELECT DISTINCT {kind}_path, strategy FROM runs"
+                f"{' WHERE strategy = ?' if strategy is not None else ''} ORDER BY {kind}_path",
+                (strategy,) if strategy is not None else ()).fetchall()
+        finally:
+            connection.close()
+        return [(os.path.join(self.path, file_path), run_strategy) for file_path, run_strategy in rows]
+
+    def __len__(self):
+        if not self.exists:
+            return 0
+        connection = self._connect()
+        try:
+            count, = connection.execute("SELECT COUNT(*) FROM runs").fetchone()
+        finally:
+            connection.close()
+        return count
+
+    def rebuild(self) -> int:
+        # Indexes every run found on the directory from its config file (results saved before the catalog existed);
+        # the only full scan of the tree.
+        runs = []
+        for directory, _, filenames in os.walk(self.path):
+            results = {
+                filename[:-len(os.path.splitext(filename)[1])]: filename for filename in filenames
+                if get_format_from_filename(filename) is not None
+            }
+            for filename in filenames:
+                if not filename.endswith("-config.json"):
+                    continue
+                prefix = filename[:-len("-config.json")]
+                confirmed, interactions = results.get(f"{prefix}-confirmed"), results.get(f"{prefix}-interactions")
+                if confirmed is None:
+                    continue
+                with open(os.path.join(directory, filename), "r") as file:
+                    config = json.loads(file.read())
+                # A batch config maps every run id to its config; runs are stored sorted by run id on the file.
+                configs = {prefix: config} if "config_id" in config else config
+                confirmed_path = os.path.join(directory, confirmed)
+                for (run_id, run_config), daily in zip(sorted(configs.items()),
+                                                       read_daily_infected_cases(confirmed_path)):
+                    runs.append(self.run(run_id, run_config, daily, confirmed_path=confirmed_path,
+                                         interactions_path=os.path.join(directory, interactions) if interactions
+                                         else None,
+                                         config_path=os.path.join(directory, filename)))
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        if runs:
+            self.add(runs)
+        return len(runs)
+
+    @staticmethod
+    def run(run_id: str, config: dict, daily_infected_cases: np.ndarray, **paths: Optional[str]) -> dict:
+        # Catalog row of a run from its config (as saved on its config file).
+        return {
+            "run_id": run_id,
+            "strategy": config.get("SOCIAL_DISTANCING_VAR_STRATEGY"),
+            "config_id": config.get("config_id"),
+            "seed": str(config["seed"]) if config.get("seed") is not None else None,
+            "days": config.get("days"),
+            "stopped_at": config.get("stopped_at"),
+            "absorbing_state": config.get("absorbing_state"),
+            **run_summary(daily_infected_cases),
+            **paths
+        }
+
+    def describe(self) -> str:
+        if not self.exists:
+            return f"* path: {self.file_path} (missing)"
+        connection = self._connect()
+        try:
+            strategies: Dict[str, int] = dict(connection.execute(
+                "SELECT strategy, COUNT(*) FROM runs GROUP BY strategy ORDER BY strategy").fetchall())
+        finally:
+            connection.close()
+        return "\n".join([
+            f"* path: {self.file_path}",
+            f"* runs: {sum(strategies.values())}",
+            *[f"* {strategy}: {count} runs" for strategy, count in strategies.items()]
+        ])
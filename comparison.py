@@ -0,0 +1,167 @@
+import json
+import logging
+import multiprocessing
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from catalog import ResultCatalog
+from config import SimulationConfig
+from core import RunFailure, Simulation, Simulator
+from models.population import Population
+from settings import *
+from stats import RunningStats
+from storage import daily_infected_cases
+from utils import spawn_seeds
+from writer import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+
+class Comparison:
+    # Paired runs of several strategies: each replicate draws a single world and runs every strategy (its
+    # people-distribution on default.json) on it, on the same process and seed (common random numbers). Differences
+    # between strategies are measured within each pair, free of the variance between worlds.
+    # Nobody recovers: the final infected cases are the peak, the mean over the days measures how fast they're reached.
+    METRICS = ["final_infected_cases", "mean_infected_cases"]
+
+    def __init__(self, strategies: Optional[List[str]] = None, replicates: int = 1, days: int = 100,
+                 risky_interactions: float = 0.05, engine: str = SOCIAL_DISTANCING_VAR_ENGINE,
+                 event_driven: bool = True, output: str = SOCIAL_DISTANCING_VAR_OUTPUT, njobs: int = -1,
+                 backend: str = SOCIAL_DISTANCING_VAR_BACKEND,
+                 output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT, early_stop: bool = True,
+                 confidence: float = 0.95, **config):
+        # Config: SimulationConfig keyword arguments shared by every strategy; anything not given comes from the
+        # environment. The first strategy is the reference of the differences.
+        if backend not in SOCIAL_DISTANCING_VAR_BACKENDS:
+            raise ValueError(f"Undefined backend: {backend}")
+        self.strategies = list(strategies or SOCIAL_DISTANCING_VAR_STRATEGIES)
+        if len(self.strategies) < 2:
+            raise ValueError("A comparison requires at least two strategies")
+        self.configs = [SimulationConfig.from_environment(strategy=strategy, **config) for strategy in self.strategies]
+        self.replicates = replicates
+        self.days = days
+        self.risky_interactions = risky_interactions
+        self.engine = engine
+        self.event_driven = event_driven
+        self.output = output
+        self.njobs = njobs if njobs > 0 else multiprocessing.cpu_count()
+        self.backend = backend
+        self.output_format = output_format
+        self.early_stop = early_stop
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Comparison(strategies={self.strategies}, replicates={self.replicates})"
+
+    def items(self, path: str, seed: Optional[int]) -> List[dict]:
+        return [
+            {
+                "id": f"pair-{replicate}",
+                "base_path": path,
+                "configs": self.configs,
+                "engine": self.engine,
+                "days": self.days,
+                "risky_interactions": self.risky_interactions,
+                "event_driven": self.event_driven,
+                "seed": replicate_seed,
+                "output": self.output,
+                "early_stop": self.early_stop
+            }
+            for replicate, replicate_seed in enumerate(spawn_seeds(seed=seed, n=self.replicates))
+        ]
+
+    @staticmethod
+    def simulate(item: dict) -> tuple:
+        # Every strategy of a pair on the same world, drawn once, and from the same simulation seed.
+        item = dict(item)
+        pair_id = item.pop("id")
+        base_path = item.pop("base_path")
+        configs = item.pop("configs")
+        world_seed, seed = spawn_seeds(seed=item.pop("seed"), n=2)
+        populations = Population.create_paired(rng=np.random.default_rng(world_seed), configs=configs)
+        runs = []
+        for config, population in zip(configs, populations):
+            simulation = Simulation.from_engine(population=population, seed=seed, **item)
+            confirmed, interactions = simulation.run(f"{pair_id}-{config.strategy}")
+            parameters = {
+                "engine": item["engine"],
+                "days": simulation.days,
+                "risky_interactions": simulation.risky_interactions,
+                "seed": seed,
+                "output": simulation.output,
+                "world": population.world_id,
+                "early_stop": simulation.early_stop,
+                "pair": pair_id
+            }
+            metadata = {**simulation.metadata, "metrics": simulation.metrics.summary()}
+            runs.append((base_path, f"{pair_id}-{config.strategy}", config, parameters, metadata, confirmed,
+                         interactions))
+        return Simulator.worker_id, pair_id, runs
+
+    def _differences(self, values: Dict[str, Dict[str, np.ndarray]]) -> Dict[str, dict]:
+        # Mean difference of every strategy with the reference and the half width of its paired confidence interval,
+        # next to the half width independent runs of both strategies (as many) would get.
+        reference = self.strategies[0]
+        differences = {}
+        for strategy in self.strategies[1:]:
+            paired, unpaired = RunningStats(), [RunningStats(), RunningStats()]
+            for pair, value in values[strategy].items():
+                paired.update(value - values[reference][pair])
+                unpaired[0].update(value)
+                unpaired[1].update(values[reference][pair])
+            unpaired_half_width = np.sqrt(sum(stats.half_width(self.confidence) ** 2 for stats in unpaired))
+            differences[strategy] = {
+                metric: {
+                    "mean": float(paired.mean[i]),
+                    "half_width": float(paired.half_width(self.confidence)[i]),
+                    "unpaired_half_width": float(unpaired_half_width[i])
+                }
+                for i, metric in enumerate(self.METRICS)
+            } if paired.size else {}
+        return differences
+
+    def run(self, path: str, seed: Optional[int] = None) -> dict:
+        # A comparison owns its directory: the pairs of another one have the same run ids on the catalog.
+        if os.path.exists(os.path.join(path, "comparison.json")) or ResultCatalog(path).exists:
+            raise ValueError(f"Comparison {path}: the directory already holds results, use another name")
+        seed = seed if seed is not None else spawn_seeds(seed=None, n=1)[0]
+        items = self.items(path, seed)
+        values: Dict[str, Dict[str, np.ndarray]] = {strategy: {} for strategy in self.strategies}
+        failures = []
+        directories = set()
+        writer = ResultWriter(
+            save=lambda key, runs: Simulator.save(key[0], self.output_format, runs, directories=directories),
+            max_pending=2 * len(self.strategies) * self.njobs, threads=self.njobs)
+        with writer:
+            for result in Simulator.dispatch(items, simulate=Comparison.simulate, backend=self.backend,
+                                             njobs=self.njobs):
+                if isinstance(result, RunFailure):
+                    failures.append(result)
+                    continue
+                worker_id, pair_id, runs = result
+                for run in runs:
+                    _, _, config, _, _, confirmed, _ = run
+                    daily = daily_infected_cases(confirmed)
+                    values[config.strategy][pair_id] = np.array([daily[-1], daily.mean()], dtype=np.float64)
+                    writer.put((worker_id, config.strategy), run)
+        for failure in failures:
+            logger.error(f"Comparison {path}: pair {failure.item['id']} failed: {failure.error}")
+        summary = {
+            "seed": seed,
+            "replicates": self.replicates,
+            "failed": len(failures),
+            "strategies": {
+                strategy: {metric: float(np.mean([pair[i] for pair in values[strategy].values()]))
+                           for i, metric in enumerate(self.METRICS)} if values[strategy] else {}
+                for strategy in self.strategies
+            },
+            "reference": self.strategies[0],
+            "confidence": self.confidence,
+            "differences": self._differences(values)
+        }
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "comparison.json"), "w") as file:
+            file.write(json.dumps(summary))
+        return summary
@@ -0,0 +1,139 @@
+from typing import Dict, List, Optional
+
+from models.place import PlaceFactory
+from settings import *
+
+
+class SimulationConfig:
+    # Population & place settings of a simulation scenario, resolved once and passed explicitly (no globals).
+    PLACE_TYPES = [
+        PlaceFactory.CHOICE.TAG_HOME,
+        PlaceFactory.CHOICE.TAG_WORKPLACE,
+        PlaceFactory.CHOICE.TAG_UNIVERSITY,
+        PlaceFactory.CHOICE.TAG_PUBLIC
+    ]
+    _default: Optional['SimulationConfig'] = None
+
+    def __init__(self, population: int, strategy: str, percent_students: float, percent_workers: float,
+                 percent_worker_students: float, percent_stay_home: float, factory_num_homes: float,
+                 factory_num_workplace: float, factory_num_university: float, factory_num_public: float):
+        # Every value is explicit: defaults come from default.json and the environment, see "from_environment".
+        if strategy not in SOCIAL_DISTANCING_VAR_STRATEGIES:
+            raise ValueError(f"Undefined strategy: {strategy}")
+        self.population = int(population)
+        self.strategy = strategy
+        # People per 100 people.
+        self.percent_students = percent_students
+        self.percent_workers = percent_workers
+        self.percent_worker_students = percent_worker_students
+        self.percent_stay_home = percent_stay_home
+        # Places per 100 people.
+        self.factory_num_homes = factory_num_homes
+        self.factory_num_workplace = factory_num_workplace
+        self.factory_num_university = factory_num_university
+        self.factory_num_public = factory_num_public
+        self._place_factories: Optional[Dict[str, PlaceFactory]] = None
+
+    def __repr__(self):
+        return f"SimulationConfig(population={self.population}, strategy={self.strategy})"
+
+    def __getstate__(self):
+        # Place factories are rebuilt (lazily) on each process instead of being pickled with the config.
+        return {**self.__dict__, "_place_factories": None}
+
+    def _count(self, per_100: float) -> int:
+        return round(float(per_100) * self.population / 100)
+
+    @property
+    def students(self) -> int:
+        return self._count(self.percent_students)
+
+    @property
+    def workers(self) -> int:
+        return self._count(self.percent_workers)
+
+    @property
+    def worker_students(self) -> int:
+        return self._count(self.percent_worker_students)
+
+    @property
+    def stay_home(self) -> int:
+        return self._count(self.percent_stay_home)
+
+    @property
+    def factory_sizes(self) -> Dict[str, int]:
+        return {
+            PlaceFactory.CHOICE.TAG_HOME: self._count(self.factory_num_homes),
+            PlaceFactory.CHOICE.TAG_WORKPLACE: self._count(self.factory_num_workplace),
+            PlaceFactory.CHOICE.TAG_UNIVERSITY: self._count(self.factory_num_university),
+            PlaceFactory.CHOICE.TAG_PUBLIC: self._count(self.factory_num_public)
+        }
+
+    @property
+    def place_factories(self) -> Dict[str, PlaceFactory]:
+        # Created on first use, one set per config (not registered on the global PlaceFactory.VALUES).
+        if self._place_factories is None:
+            self._place_factories = {
+                name: PlaceFactory(name=name, n_options=n_options, register=False)
+                for name, n_options in self.factory_sizes.items()
+            }
+        return self._place_factories
+
+    def place_factory_list(self, names: Optional[List[str]] = None) -> List[PlaceFactory]:
+        return [self.place_factories[name] for name in (names if names is not None else self.PLACE_TYPES)]
+
+    def to_dict(self) -> dict:
+        # Same variable names as the environment, recorded on the run configs and hashed on the result cache key.
+        return {
+            "SOCIAL_DISTANCING_VAR_POPULATION": self.population,
+            "SOCIAL_DISTANCING_VAR_STRATEGY": self.strategy,
+            "SOCIAL_DISTANCING_VAR_PERCENT_STUDENTS": self.percent_students,
+            "SOCIAL_DISTANCING_VAR_STUDENTS": self.students,
+            "SOCIAL_DISTANCING_VAR_PERCENT_WORKERS": self.percent_workers,
+            "SOCIAL_DISTANCING_VAR_WORKERS": self.workers,
+            "SOCIAL_DISTANCING_VAR_PERCENT_WORKER_STUDENTS": self.percent_worker_students,
+            "SOCIAL_DISTANCING_VAR_WORKER_STUDENTS": self.worker_students,
+            "SOCIAL_DISTANCING_VAR_PERCENT_STAY_HOME": self.percent_stay_home,
+            "SOCIAL_DISTANCING_VAR_STAY_HOME": self.stay_home,
+            **{
+                f"SOCIAL_DISTANCING_VAR_FACTORY_NUM_{name}": self.factory_sizes[factory]
+                for name, factory in zip(["HOMES", "WORKPLACE", "UNIVERSITY", "PUBLIC"], self.PLACE_TYPES)
+            }
+        }
+
+    def replace(self, **kwargs) -> 'SimulationConfig':
+        values = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+        return SimulationConfig(**{**values, **kwargs})
+
+    @staticmethod
+    def from_environment(strategy: Optional[str] = None, **kwargs) -> 'SimulationConfig':
+        # Environment variables overwrite the default.json values; keyword arguments overwrite both.
+        default_values = get_default_values()
+        strategy = strategy or os.environ.get("SOCIAL_DISTANCING_VAR_STRATEGY", default_values["strategy"])
+        if strategy not in SOCIAL_DISTANCING_VAR_STRATEGIES:
+            raise ValueError(f"Undefined strategy: {strategy}")
+        people_distribution = default_values.get("scenarios", {}).get(strategy, {}).get("people-distribution", {})
+        values = {
+            "population": int(os.environ.get("SOCIAL_DISTANCING_VAR_POPULATION", default_values["population"])),
+            "strategy": strategy,
+            "percent_students": int(os.environ.get(
+                "SOCIAL_DISTANCING_VAR_PERCENT_STUDENTS", people_distribution["students"])),
+            "percent_workers": int(os.environ.get(
+                "SOCIAL_DISTANCING_VAR_PERCENT_WORKERS", people_distribution["workers"])),
+            "percent_worker_students": int(os.environ.get(
+                "SOCIAL_DISTANCING_VAR_PERCENT_WORKER_STUDENTS", people_distribution["worker-students"])),
+            "percent_stay_home": int(os.environ.get(
+                "SOCIAL_DISTANCING_VAR_PERCENT_STAY_HOME", people_distribution["stay-home"])),
+            "factory_num_homes": float(os.environ.get("SOCIAL_DISTANCING_VAR_FACTORY_NUM_HOMES", "20")),
+            "factory_num_workplace": float(os.environ.get("SOCIAL_DISTANCING_VAR_FACTORY_NUM_WORKPLACE", "10")),
+            "factory_num_university": float(os.environ.get("SOCIAL_DISTANCING_VAR_FACTORY_NUM_UNIVERSITY", "1")),
+            "factory_num_public": float(os.environ.get("SOCIAL_DISTANCING_VAR_FACTORY_NUM_PUBLIC", "15"))
+        }
+        return SimulationConfig(**{**values, **kwargs})
+
+    @staticmethod
+    def default() -> 'SimulationConfig':
+        # Environment config, resolved on first use and shared by everything that isn't given an explicit config.
+        if SimulationConfig._default is None:
+            SimulationConfig._default = SimulationConfig.from_environment()
+        return SimulationConfig._default
@@ -1,146 +1,687 @@
+import collections
 import concurrent.futures
+import contextlib
 import datetime
+import functools
 import itertools
 import queue
 import logging
 import multiprocessing
 import random
+import tempfile
+import time
 import uuid
-from typing import List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from models.person import Person, PersonFactory
+from cache import ResultCache
+from catalog import ResultCatalog
+from config import SimulationConfig
+from metrics import SimulationMetrics, SimulatorMetrics
+from models.occupancy import Occupancy
+from models.person import Person
+from models.place import PlaceTable
+from models.population import Population
+from results import RESULTS
 from settings import *
-from utils import get_dict_hash_key
-
-STRATEGY = SOCIAL_DISTANCING_VAR_STRATEGY
+from stats import ConvergenceCriterion
+from storage import confirmed_frame, daily_infected_cases, get_format, interactions_frame
+from utils import get_dict_hash_key, sample_pairs, spawn_seeds
+from writer import ResultWriter
 
 logger = logging.getLogger(__name__)
 
+ABSORBING_STATE_SATURATED = "saturated"
+ABSORBING_STATE_EXTINCT = "extinct"
+ABSORBING_STATE_ISOLATED = "isolated"
+
+# A simulation that raised, returned by the workers in place of its results.
+RunFailure = collections.namedtuple("RunFailure", ["worker_id", "item", "error"])
+
 
 class Simulation(object):
 
-    def __init__(self, days: int,  risky_interactions: float = 0.05):
+    def __init__(self, days: int,  risky_interactions: float = 0.05, event_driven: bool = True,
+                 seed: Optional[int] = None, output: str = SOCIAL_DISTANCING_VAR_OUTPUT, history_days: int = 0,
+                 population: Optional[Population] = None, config: Optional[SimulationConfig] = None,
+                 early_stop: bool = True, progress_interval: float = 0, metrics_path: Optional[str] = None):
+        if output not in RESULTS:
+            raise ValueError(f"Undefined output: {output}")
         self.days = days
         self.risky_interactions = risky_interactions
-        self.people = [
-            *PersonFactory.create_people_with_route_student(
-                k=SOCIAL_DISTANCING_VAR_STUDENTS,
-                infected_cases=0
-            ),
-            *PersonFactory.create_people_with_route_worker(
-                k=SOCIAL_DISTANCING_VAR_WORKERS,
-                infected_cases=1
-            ),
-            *PersonFactory.create_people_with_route_worker_student(
-                k=SOCIAL_DISTANCING_VAR_WORKER_STUDENTS,
-                infected_cases=1
-            ),
-            *PersonFactory.create_people_with_route_stay_home(
-                k=SOCIAL_DISTANCING_VAR_STAY_HOME,
-                infected_cases=0
-            )
+        self.event_driven = event_driven
+        self.output = output
+        self.early_stop = early_stop
+        # Where the run stopped early (tick) and why, see "_absorbing_state".
+        self.metadata = {"stopped_at": None, "absorbing_state": None}
+        # Progress of the run logged (and appended to the "metrics_path" json lines) every "progress_interval" seconds.
+        self.progress_interval = progress_interval
+        self.metrics_path = metrics_path
+        self.metrics: Optional[SimulationMetrics] = None
+        self.seed = seed if seed is not None else spawn_seeds(seed=None, n=1)[0]
+        self.random = random.Random(self.seed)
+        # Two streams of the simulation seed: the world and the interactions ("rng"), the initial infections and the
+        # daily routes ("schedule_rng"). The schedule doesn't depend on how many interactions were drawn, so the
+        # paired runs of a comparison follow the same routes every day.
+        interaction_seed, schedule_seed = np.random.SeedSequence(self.seed).spawn(2)
+        self.rng = np.random.default_rng(interaction_seed)
+        self.schedule_rng = np.random.default_rng(schedule_seed)
+        self.config = population.config if population is not None else \
+            config if config is not None else SimulationConfig.default()
+        # The world (people and the places on each of their route slots) is drawn from the simulation seed unless a
+        # shared population snapshot is given; initial infections are always drawn from the simulation seed.
+        self.population = population if population is not None else Population.create(rng=self.rng, config=self.config)
+        self._build(infected=self.population.infect(self.schedule_rng))
+        # Routes are drawn for the whole population at each day boundary, grouped by archetype.
+        self.route_indexes = np.zeros(len(self.population), dtype=np.int8)
+        self._archetypes = [
+            (np.array(archetype.cum_weights) / archetype.cum_weights[-1], members)
+            for archetype, members in self.population.members()
         ]
+        # Optional history of the route index followed each day: a ring buffer of the last "history_days" days
+        # (every day when negative).
+        self.history_days = days if history_days < 0 else history_days
+        self._history = np.zeros((self.history_days, len(self.population)), dtype=np.int8)
+        self._days_selected = 0
+        self._risky_place_table = None
+
+    def _build(self, infected: np.ndarray):
+        self.people = self.population.create_people(infected)
+
+    @property
+    def route_history(self) -> np.ndarray:
+        # (days, people) route indexes, oldest day first; (0, people) when no history is kept.
+        if not self.history_days or self._days_selected <= self.history_days:
+            return self._history[:self._days_selected]
+        start = self._days_selected % self.history_days
+        return np.concatenate([self._history[start:], self._history[:start]])
+
+    def _select_routes(self):
+        # Paired populations draw for the whole shared world: a person follows the same route on every scenario.
+        uniforms = self.population.uniforms(self.schedule_rng)
+        for cum_weights, members in self._archetypes:
+            draws = uniforms[members] if uniforms is not None else self.schedule_rng.random(len(members))
+            self.route_indexes[members] = np.searchsorted(cum_weights, draws, side="right")
+        if self.history_days:
+            self._history[self._days_selected % self.history_days] = self.route_indexes
+        self._days_selected += 1
+
+    def _schedule_day(self, t: int):
+        self._select_routes()
+        # People only change place at the stop boundaries of the route they follow today.
+        self._events = [[] for _ in range(100)]
+        self._events_cursor = 0
+        for person, index in zip(self.people, self.route_indexes.tolist()):
+            for start, place in person.routes.boundaries(index):
+                self._events[start].append((person, place))
 
     def _get_places(self, t: int):
-        places = {}
-        infected_cases = 0
-        for person in self.people:
-            place = person.position(t)
-            key = f"{place.name}-{place.id}"
-            places[key] = places.get(key, []) + [person]
-            if person.infected:
-                infected_cases += 1
-        return places, infected_cases
+        # Apply every move up to "t"; ticks skipped by the event-driven mode are caught up here.
+        for events in self._events[self._events_cursor:t % 100 + 1]:
+            for person, place in events:
+                self.occupancy.move(person, place)
+        self._events_cursor = t % 100 + 1
+        return self.occupancy.groups, self.occupancy.infected_cases
 
     def _interactions(self, group: List[Person]):
-        interactions_total = tuple(itertools.combinations(group, r=2))
-        interactions_risky = int(self.risky_interactions * len(interactions_total))
-        for a, b in random.choices(interactions_total, k=interactions_risky):
+        interactions_total = len(group) * (len(group) - 1) // 2
+        interactions_risky = int(self.risky_interactions * interactions_total)
+        for a, b in sample_pairs(group, k=interactions_risky, rng=self.random):
+            if a.infected == b.infected:
+                continue
+            susceptible = b if a.infected else a
             a.interact(b)
-        return len(interactions_total), interactions_risky
+            self.occupancy.infect(susceptible)
+        return interactions_total, interactions_risky
+
+    def _ticks(self):
+        # The infected count only changes on interaction ticks (every 10 ticks), the event-driven mode skips the rest.
+        return range(0, self.days * 100, 10 if self.event_driven else 1)
+
+    def _fill_confirmed(self, results, t: int, infected_cases: int):
+        if self.event_driven:
+            results.add_confirmed(t + 1, infected_cases, until=min(t + 10, self.days * 100))
+
+    def _infected(self) -> np.ndarray:
+        return np.fromiter((person.infected for person in self.people), dtype=bool, count=len(self.people))
+
+    def _risky_places(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Every (person, route table row) a person may follow and, on each interaction tick, the places that can hold a
+        # risky interaction at all: their group can't be bigger than everyone who may be there. Fixed for a world.
+        if self._risky_place_table is None:
+            route_table, person_routes = self.population.route_tables()
+            members = [(len(archetype.templates), indexes) for archetype, indexes in self.population.members()]
+            people = np.concatenate([np.repeat(indexes, templates) for templates, indexes in members])
+            rows = np.concatenate([person_routes[indexes, :templates].ravel() for templates, indexes in members])
+            sizes = np.stack([
+                np.bincount(route_table[rows, k], minlength=int(route_table.max()) + 1)
+                for k in range(route_table.shape[1])
+            ]).astype(np.int64)
+            self._risky_place_table = (people, rows, (self.risky_interactions * (sizes * (sizes - 1) // 2)) >= 1)
+        return self._risky_place_table
+
+    def _isolated(self, infected: np.ndarray) -> bool:
+        # No susceptible person can be infected, whatever routes they follow: on every interaction tick, no place that
+        # can hold a risky interaction may be visited by both an infected and a susceptible person.
+        route_table, _ = self.population.route_tables()
+        people, rows, risky_places = self._risky_places()
+        infected = infected[people]
+        for k, risky in enumerate(risky_places):
+            exposed = np.zeros(len(risky), dtype=bool)
+            exposed[route_table[rows[infected], k]] = True
+            if (exposed & risky)[route_table[rows[~infected], k]].any():
+                return False
+        return True
+
+    def _absorbing_state(self, t: int, infected_cases: int) -> Optional[str]:
+        # Nobody recovers and there are no reintroductions: once everyone (or no one) is infected, nothing changes.
+        if not self.early_stop:
+            return None
+        if infected_cases == len(self.population):
+            return ABSORBING_STATE_SATURATED
+        if infected_cases == 0:
+            return ABSORBING_STATE_EXTINCT
+        # Isolation is only checked on the last interaction tick of days that didn't infect anyone.
+        if t % 100 != 90:
+            return None
+        stalled, self._daily_infected_cases = infected_cases == self._daily_infected_cases, infected_cases
+        if stalled and self._isolated(self._infected()):
+            return ABSORBING_STATE_ISOLATED
+        return None
+
+    def _stop(self, results, t: int, infected_cases: int, state: str, item_id: str):
+        # Called on an interaction tick, once its confirmed cases are recorded: the rest of the series is constant.
+        start = t + 10 if self.event_driven else t + 1
+        if start < self.days * 100:
+            results.add_confirmed(start, infected_cases, until=self.days * 100)
+        results.stop(t)
+        self.metadata = {"stopped_at": t, "absorbing_state": state}
+        logger.info(f"Simulation {item_id}: {state} on day {t // 100}, stopped early")
+
+    def _start(self, item_id: str, place_keys=None) -> SimulationMetrics:
+        self.metadata = {"stopped_at": None, "absorbing_state": None}
+        self._daily_infected_cases = None
+        self.metrics = SimulationMetrics(days=self.days, item_id=item_id, place_keys=place_keys,
+                                         step=10 if self.event_driven else 1,
+                                         progress_interval=self.progress_interval, stream=self.metrics_path)
+        return self.metrics
 
     def run(self, item_id: Optional[str] = None):
         item_id = item_id if item_id is not None else str(uuid.uuid4())
-        logger.info(f"Simulation {item_id}: STARTED")
-        results_confirmed = []
-        results_interactions = []
-        for t in range(self.days * 100):
-            places, infected_cases = self._get_places(t)
-            results_confirmed.append(
-                {
-                    "time": t,
-                    "infected_cases": infected_cases
-                }
-            )
-            for place, group in places.items():
-                # Run interactions every 10 times a day.
-                if t % 10:
-                    continue
-                total, risky = self._interactions(group)
-                results_interactions.append({
-                    "time": t,
-                    "place": place,
-                    "group": len(group),
-                    "interactions_total": total,
-                    "interactions_risky": risky,
-                    "infected": len([p for p in group if p.infected])
-                })
-        logger.info(f"Simulation {item_id}: ENDED")
-        return results_confirmed, results_interactions
+        logger.info(f"Simulation {item_id}: STARTED (seed={self.seed})")
+        metrics = self._start(item_id)
+        self.occupancy = Occupancy()
+        results = RESULTS[self.output](days=self.days)
+        for t in self._ticks():
+            start = time.perf_counter()
+            if not t % 100:
+                with metrics.phase("schedule"):
+                    self._schedule_day(t)
+            with metrics.phase("places"):
+                places, infected_cases = self._get_places(t)
+            with metrics.phase("results"):
+                results.add_confirmed(t, infected_cases)
+            # Run interactions every 10 times a day.
+            if t % 10:
+                metrics.add_tick(t, start, infected_cases)
+                continue
+            with metrics.phase("interactions"):
+                interactions = [self._interactions(group) for group in places.values()]
+            groups = [len(group) for group in places.values()]
+            with metrics.phase("results"):
+                results.add_interactions(
+                    t,
+                    places=list(places),
+                    groups=groups,
+                    totals=[total for total, _ in interactions],
+                    risky=[risky for _, risky in interactions],
+                    infected=[self.occupancy.infected[place] for place in places]
+                )
+                self._fill_confirmed(results, t, self.occupancy.infected_cases)
+            metrics.add_groups(list(places), groups)
+            metrics.add_tick(t, start, self.occupancy.infected_cases)
+            with metrics.phase("early_stop"):
+                state = self._absorbing_state(t, self.occupancy.infected_cases)
+            if state is not None:
+                self._stop(results, t, self.occupancy.infected_cases, state, item_id)
+                break
+        metrics.end()
+        logger.info(f"Simulation {item_id}: ENDED ({metrics.sim_days_per_second:.2f} sim-days/s)")
+        return results.results()
+
+    @staticmethod
+    def from_engine(engine: str = SOCIAL_DISTANCING_VAR_ENGINE, **kwargs) -> 'Simulation':
+        if engine not in ENGINES:
+            raise ValueError(f"Undefined engine: {engine}")
+        return ENGINES[engine](**kwargs)
+
+
+class VectorizedSimulation(Simulation):
+
+    def _build(self, infected: np.ndarray):
+        # The route tables are read-only and can be shared (memory-mapped) by every simulation on the same world;
+        # only the infection flags and the current routes are private to the run.
+        self.place_keys = PlaceTable(self.config.place_factory_list())
+        self.infected = infected
+        self.route_table, self.person_routes = self.population.route_tables()
+        self.current_routes = np.zeros(len(self.population), dtype=np.int32)
+
+    def _infected(self) -> np.ndarray:
+        return self.infected
+
+    def _select_routes(self):
+        super()._select_routes()
+        self.current_routes = self.person_routes[np.arange(len(self.population)), self.route_indexes]
+
+    def _get_places(self, t: int):
+        positions = self.route_table[self.current_routes, t % 100 // 10]
+        order = np.argsort(positions, kind="stable")
+        place_ids, starts, sizes = np.unique(positions[order], return_index=True, return_counts=True)
+        return order, place_ids, starts, sizes
+
+    def _interactions(self, order: np.ndarray, starts: np.ndarray, sizes: np.ndarray):
+        totals = sizes.astype(np.int64) * (sizes - 1) // 2
+        risky = (self.risky_interactions * totals).astype(np.int64)
+        # Draw the risky pairs of every group at once: "a" uniformly on the group, "b" on the rest of it.
+        group_sizes = np.repeat(sizes, risky)
+        group_starts = np.repeat(starts, risky)
+        a = (self.rng.random(len(group_sizes)) * group_sizes).astype(np.int64)
+        b = (self.rng.random(len(group_sizes)) * (group_sizes - 1)).astype(np.int64)
+        b += b >= a
+        a, b = order[group_starts + a], order[group_starts + b]
+        # Interactions within the same tick are resolved against the infection state at its start.
+        infected = self.infected.copy()
+        self.infected[a[infected[b]]] = True
+        self.infected[b[infected[a]]] = True
+        return totals, risky
+
+    def run(self, item_id: Optional[str] = None):
+        item_id = item_id if item_id is not None else str(uuid.uuid4())
+        logger.info(f"Simulation {item_id}: STARTED (seed={self.seed})")
+        metrics = self._start(item_id, place_keys=self.place_keys)
+        results = RESULTS[self.output](days=self.days, place_keys=self.place_keys)
+        for t in self._ticks():
+            start = time.perf_counter()
+            if not t % 100:
+                with metrics.phase("schedule"):
+                    self._select_routes()
+            with metrics.phase("results"):
+                results.add_confirmed(t, int(self.infected.sum()))
+            # Run interactions every 10 times a day.
+            if t % 10:
+                metrics.add_tick(t, start, int(self.infected.sum()))
+                continue
+            with metrics.phase("places"):
+                order, place_ids, starts, sizes = self._get_places(t)
+            with metrics.phase("interactions"):
+                totals, risky = self._interactions(order, starts, sizes)
+                infected = np.add.reduceat(self.infected[order].astype(np.int64), starts)
+            infected_cases = int(self.infected.sum())
+            with metrics.phase("results"):
+                results.add_interactions(t, places=place_ids, groups=sizes, totals=totals, risky=risky,
+                                         infected=infected)
+                self._fill_confirmed(results, t, infected_cases)
+            metrics.add_groups(place_ids, sizes)
+            metrics.add_tick(t, start, infected_cases)
+            with metrics.phase("early_stop"):
+                state = self._absorbing_state(t, infected_cases)
+            if state is not None:
+                self._stop(results, t, infected_cases, state, item_id)
+                break
+        metrics.end()
+        logger.info(f"Simulation {item_id}: ENDED ({metrics.sim_days_per_second:.2f} sim-days/s)")
+        return results.results()
+
+
+ENGINES = {
+    SOCIAL_DISTANCING_TAG_ENGINE_PYTHON: Simulation,
+    SOCIAL_DISTANCING_TAG_ENGINE_NUMPY: VectorizedSimulation
+}
 
 
 class Simulator:
-    simulation_queue = queue.Queue()
+    worker_id: Optional[str] = None
+    worlds: Dict[str, Population] = {}
 
-    def __init__(self, simulations: int = 1, njobs: int = -1):
+    def __init__(self, simulations: int = 1, njobs: int = -1, backend: str = SOCIAL_DISTANCING_VAR_BACKEND,
+                 chunksize: int = 1, cache: bool = True, output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT,
+                 batch_size: int = 1, config: Optional[SimulationConfig] = None, progress_interval: float = 0,
+                 metrics_path: Optional[str] = None, retries: int = 2):
+        if backend not in SOCIAL_DISTANCING_VAR_BACKENDS:
+            raise ValueError(f"Undefined backend: {backend}")
         self.simulations = simulations
+        # Times a failed simulation is run again before it's given up (and reported as failed).
+        self.retries = retries
+        self.simulation_queue = queue.Queue()
         self.njobs = njobs if not njobs else njobs if njobs > 0 else multiprocessing.cpu_count()
+        self.backend = backend
+        self.chunksize = chunksize
+        self.cache = cache
+        self.output_format = get_format(output_format).name
+        self.batch_size = batch_size
+        self.config = config if config is not None else SimulationConfig.default()
+        # Progress of the simulations (and of each of them) logged every "progress_interval" seconds and appended to
+        # the "metrics_path" json lines, along with the metrics of every run.
+        self.progress_interval = progress_interval
+        self.metrics_path = metrics_path
+        self.metrics: Optional[SimulatorMetrics] = None
+
+    @staticmethod
+    def save(worker_id: str, output_format: str, runs: List[tuple], directories: Optional[set] = None,
+             path: Optional[str] = None, prefix: Optional[str] = None):
+        # Files go to "{base path}/{strategy}/{worker id}/{prefix}-*" unless a path (or prefix) is given.
+        result_format = get_format(output_format)
+        now = datetime.datetime.now().strftime("%Y-%m-%d")
+        configs = {}
+        confirmed_frames = []
+        interactions_frames = []
+        for base_path, item_id, simulation_config, parameters, metadata, confirmed, interactions in runs:
+            config_id = get_dict_hash_key(dictionary=get_scenario_config(simulation_config, **parameters))
+            configs[item_id] = {
+                **get_global_environment_vars(),
+                **simulation_config.to_dict(),
+                **parameters,
+                **metadata,
+                "config_id": config_id
+            }
+            # A batch of runs goes into a single dataset, distinguished by the "run_id" column.
+            run_id = item_id if len(runs) > 1 else None
+            confirmed_frames.append(confirmed_frame(confirmed, run_id=run_id))
+            interactions_frames.append(interactions_frame(interactions, run_id=run_id))
+        base_path, item_id, simulation_config, *_ = runs[0]
+        file_path = path if path is not None else os.path.join(base_path, simulation_config.strategy, worker_id)
+        # Directories already created (by this writer) aren't checked again.
+        if directories is None or file_path not in directories:
+            os.makedirs(file_path, exist_ok=True)
+            if directories is not None:
+                directories.add(file_path)
+        if len(runs) > 1:
+            prefix = prefix if prefix is not None else f"{now}-{uuid.uuid4()}-batch"
+            config = configs
+            df_confirmed = pd.concat(confirmed_frames, ignore_index=True)
+            df_interactions = pd.concat(interactions_frames, ignore_index=True)
+            # Categories differ between runs, the concat falls back to objects so they're re-encoded here.
+            for df in [df_confirmed, df_interactions]:
+                for column in ["place", "run_id"]:
+                    if column in df:
+                        df[column] = df[column].astype("category")
+        else:
+            config = configs[item_id]
+            prefix = prefix if prefix is not None else f"{now}-{item_id}-{config['config_id']}"
+            df_confirmed, = confirmed_frames
+            df_interactions, = interactions_frames
+        result_format.write(df_confirmed, os.path.join(file_path, f"{prefix}-confirmed{result_format.extension}"))
+        result_format.write(df_interactions, os.path.join(file_path, f"{prefix}-interactions{result_format.extension}"))
+        # Save configuration variables
+        with open(os.path.join(file_path, f"{prefix}-config.json"), "w") as f:
+            f.write(json.dumps(config))
+        # Runs are cataloged once their files are complete (a single run is identified by its file prefix).
+        ResultCatalog(base_path).add([
+            ResultCatalog.run(
+                run_id if len(runs) > 1 else prefix, configs[run_id], daily_infected_cases(confirmed),
+                confirmed_path=os.path.join(file_path, f"{prefix}-confirmed{result_format.extension}"),
+                interactions_path=os.path.join(file_path, f"{prefix}-interactions{result_format.extension}"),
+                config_path=os.path.join(file_path, f"{prefix}-config.json")
+            )
+            for _, run_id, _, _, _, confirmed, _ in runs
+        ])
+
+    @staticmethod
+    def simulate(item: dict):
+        item = dict(item)
+        item_id = item.pop("id")
+        base_path = item.pop("base_path")
+        world = item.pop("world", None)
+        population = Simulator.attach_world(world, config=item["config"]) if world else None
+        config = item["config"] if item.get("config") is not None else SimulationConfig.default()
+        # Everything that determines the outcome of the simulation (the event-driven mode doesn't).
+        parameters = {
+            "engine": item["engine"],
+            "days": item["days"],
+            "risky_interactions": item["risky_interactions"],
+            "seed": item["seed"],
+            "output": item["output"],
+            "world": population.world_id if population is not None else None,
+            # No interactions are recorded after an early stop.
+            "early_stop": item["early_stop"]
+        }
+        # The key is known before anything is built: a cached run doesn't draw its population.
+        cache = ResultCache() if item.pop("cache") and item["seed"] is not None else None
+        key = ResultCache.key(get_simulation_config(config, **parameters)) if cache is not None else None
+        results = cache.get(key) if cache is not None else None
+        metrics = None
+        if results is not None:
+            logger.info(f"Simulation {item_id}: reused cached results {key}")
+        else:
+            simulation = Simulation.from_engine(population=population, **item)
+            parameters["seed"] = simulation.seed
+            results = (*simulation.run(item_id), simulation.metadata)
+            metrics = simulation.metrics.summary() if simulation.metrics is not None else None
+            if cache is not None:
+                cache.put(key, results)
+        confirmed, interactions, metadata = results
+        # Metrics of this run only (none when the results come from the cache), never cached.
+        metadata = {**metadata, "metrics": metrics}
+        return Simulator.worker_id, base_path, item_id, config, parameters, metadata, confirmed, interactions
+
+    @staticmethod
+    def attach_world(path: str, config: Optional[SimulationConfig] = None) -> Population:
+        # Each worker memory-maps a world snapshot once: its pages are shared by every process reading it.
+        if path not in Simulator.worlds:
+            Simulator.worlds[path] = Population.load(path, config=config)
+        return Simulator.worlds[path]
+
+    @staticmethod
+    def initializer():
+        Simulator.worker_id = str(uuid.uuid4())
+
+    @staticmethod
+    def attempt(item: dict, simulate: Optional[Callable[[dict], tuple]] = None):
+        # Failures come back as results instead of raising on the pool, so the rest of the runs go on.
+        try:
+            return (simulate or Simulator.simulate)(item)
+        except Exception as e:
+            logger.exception(f"Simulation {item['id']}: FAILED")
+            return RunFailure(worker_id=Simulator.worker_id, item=item, error=repr(e))
+
+    @staticmethod
+    def _with_worker_id(result, worker_id: str):
+        # Thread workers share the parent process (without worker id): their results get the one given.
+        if isinstance(result, RunFailure):
+            return result._replace(worker_id=result.worker_id or worker_id)
+        return (result[0] or worker_id, *result[1:])
+
+    @staticmethod
+    def dispatch(items: List[dict], simulate: Optional[Callable[[dict], tuple]] = None,
+                 backend: str = SOCIAL_DISTANCING_VAR_BACKEND, njobs: int = 1) -> Iterator:
+        # Every item attempted (see "attempt") on a pool of "njobs" workers, one at a time: workers pick up the next
+        # item as soon as they're done. Results (worker id first) and failures come back as they finish.
+        attempt = functools.partial(Simulator.attempt, simulate=simulate)
+        if backend == SOCIAL_DISTANCING_TAG_BACKEND_PROCESS:
+            with multiprocessing.Pool(processes=njobs, initializer=Simulator.initializer) as pool:
+                yield from pool.imap_unordered(attempt, items, chunksize=1)
+            return
+        thread_worker_id = str(uuid.uuid4())
+        with concurrent.futures.ThreadPoolExecutor(max_workers=njobs) as executor:
+            futures = [executor.submit(attempt, item) for item in items]
+            for future in concurrent.futures.as_completed(futures):
+                yield Simulator._with_worker_id(future.result(), thread_worker_id)
 
     @staticmethod
-    def worker(q: queue.Queue):
+    def worker(q: queue.Queue, writer: ResultWriter, metrics: Optional[SimulatorMetrics] = None):
+        # Runs until the queue is empty; a failed simulation is put back on the queue while it has retries left.
+        # Results are handed over to the writer, the worker goes on with the next simulation.
         worker_id = str(uuid.uuid4())
         while True:
             try:
                 item = q.get(block=False)
-                item_id = item.pop("id")
-                base_path = item.pop("base_path")
-                # Configuration
-                now = datetime.datetime.now().strftime("%Y-%m-%d")
-                config = get_global_environment_vars()
-                config_id = get_dict_hash_key(dictionary=config)
-                # Run Simulation
-                simulation = Simulation(**item)
-                confirmed, interactions = simulation.run(item_id)
-                file_path = os.path.join(base_path, STRATEGY, worker_id)
-                os.makedirs(file_path, exist_ok=True)
-                # Save confirmed data
-                filename_confirmed = f"{now}-{item_id}-{config_id}-confirmed.csv"
-                df_confirmed = pd.DataFrame(confirmed)
-                df_confirmed["day"] = [int(t / 100) for t in df_confirmed.time]
-                df_confirmed.to_csv(os.path.join(file_path, filename_confirmed), index=False)
-                # Save interactions data
-                filename_interactions = f"{now}-{item_id}-{config_id}-interactions.csv"
-                df_interactions = pd.DataFrame(interactions)
-                df_interactions["day"] = [int(t / 100) for t in df_interactions.time]
-                df_interactions.to_csv(os.path.join(file_path, filename_interactions), index=False)
-                # Save configuration variables
-                with open(os.path.join(file_path, f"{now}-{item_id}-{config_id}-config.json"), "w") as f:
-                    f.write(json.dumps(config))
-            except Exception as e:
-                if str(e):
-                    logger.error(f"Worker {worker_id} encountered the following error: {e}")
-                return
-
-    def run(self, days: int = 50,  risky_interactions: float = 0.05, output_path: str = ""):
-        for _ in range(self.simulations):
-            self.simulation_queue.put({
+            except queue.Empty:
+                break
+            result = Simulator.attempt(item)
+            if isinstance(result, RunFailure):
+                if metrics is not None and metrics.add_failure(worker_id, item["id"], result.error):
+                    q.put(item)
+                continue
+            _, *results = result
+            if metrics is not None:
+                metrics.add(worker_id, results[1], results[4])
+            writer.put(worker_id, results)
+
+    def _writer(self) -> ResultWriter:
+        # Up to two batches per worker wait to be written before the workers are held back, one thread per worker
+        # writes them.
+        directories = set()
+        return ResultWriter(
+            save=lambda worker_id, runs: self.save(worker_id, self.output_format, runs, directories=directories),
+            batch_size=self.batch_size,
+            max_pending=2 * self.batch_size * max(self.njobs or 1, 1),
+            threads=max(self.njobs or 1, 1)
+        )
+
+    def _run_threads(self, items: List[dict], writer: ResultWriter):
+        for item in items:
+            self.simulation_queue.put(item)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.njobs) as executor:
+            workers = [
+                executor.submit(self.worker, **{
+                    "q": self.simulation_queue,
+                    "writer": writer,
+                    "metrics": self.metrics
+                })
+                for _ in range(self.njobs)
+            ]
+        # Errors that stopped a worker (e.g. writing its results) are raised instead of looking like a finished one.
+        for worker in workers:
+            worker.result()
+
+    def _completed(self, results: Iterable, retry: List[dict]) -> Iterator[tuple]:
+        # Completed runs go on to be saved; failed ones are counted and, while they have retries left, kept on "retry".
+        for result in results:
+            if not isinstance(result, RunFailure):
+                yield result
+            elif self.metrics.add_failure(result.worker_id, result.item["id"], result.error):
+                retry.append(result.item)
+
+    def _save_results(self, results: Iterable[tuple], writer: ResultWriter):
+        # Results are handed over to the writer as soon as any worker finishes a simulation.
+        for worker_id, *run in results:
+            self.metrics.add(worker_id, run[1], run[4])
+            writer.put(worker_id, run)
+
+    def _run_processes(self, items: List[dict], writer: ResultWriter):
+        # Failed runs are retried on the same pool once the rest of the round is done.
+        with multiprocessing.Pool(processes=self.njobs, initializer=self.initializer) as pool:
+            while items:
+                retry = []
+                self._save_results(self._completed(
+                    pool.imap_unordered(self.attempt, items, chunksize=self.chunksize), retry), writer)
+                items = retry
+
+    def _run_adaptive(self, items: List[dict], criterion: ConvergenceCriterion):
+        # At most "njobs" simulations in flight; a new one is only submitted while the criterion isn't met.
+        if self.backend == SOCIAL_DISTANCING_TAG_BACKEND_PROCESS:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.njobs, initializer=self.initializer)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.njobs)
+        # Thread workers share the parent process (without worker id), their runs are saved together.
+        thread_worker_id = str(uuid.uuid4())
+        items = iter(items)
+        with executor:
+            pending = {executor.submit(self.attempt, item) for item in itertools.islice(items, self.njobs)}
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    result = self._with_worker_id(future.result(), thread_worker_id)
+                    if isinstance(result, RunFailure):
+                        # A retry doesn't wait for the criterion: the run was already part of the replicates.
+                        if self.metrics.add_failure(result.worker_id, result.item["id"], result.error):
+                            pending.add(executor.submit(self.attempt, result.item))
+                            continue
+                    else:
+                        criterion.update(daily_infected_cases(result[-2]))
+                        yield result
+                    item = next(items, None) if not criterion.converged else None
+                    if item is not None:
+                        pending.add(executor.submit(self.attempt, item))
+
+    @contextlib.contextmanager
+    def _world(self, world: Optional[str], shared_world: bool, seed: Optional[int]):
+        if not shared_world or world:
+            yield world
+            return
+        # A single world is drawn from the master seed and saved once; workers attach it read-only.
+        with tempfile.TemporaryDirectory(prefix="social-distancing-world-") as path:
+            Population.create(rng=np.random.default_rng(seed), config=self.config).save(path)
+            try:
+                yield path
+            finally:
+                Simulator.worlds.pop(path, None)
+
+    def _items(self, n: int, days: int, risky_interactions: float, output_path: str, engine: str,
+               event_driven: bool, seed: Optional[int], output: str, world: Optional[str],
+               early_stop: bool) -> List[dict]:
+        # Every simulation gets its own stream split from the master seed, so any run can be reproduced alone.
+        return [
+            {
                 "id": str(uuid.uuid4()),
                 "base_path": output_path,
+                "engine": engine,
                 "days": days,
-                "risky_interactions": risky_interactions
-            })
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.njobs) as executor:
-            for _ in range(self.njobs):
-                executor.submit(self.worker, **{"q": self.simulation_queue})
+                "risky_interactions": risky_interactions,
+                "event_driven": event_driven,
+                "seed": simulation_seed,
+                "output": output,
+                "world": world,
+                "early_stop": early_stop,
+                "progress_interval": self.progress_interval,
+                "metrics_path": self.metrics_path,
+                "config": self.config,
+                # Runs without a master seed can't be reproduced: caching them would only fill the cache.
+                "cache": self.cache and seed is not None
+            }
+            for simulation_seed in spawn_seeds(seed=seed, n=n)
+        ]
+
+    def run(self, days: int = 50,  risky_interactions: float = 0.05, output_path: str = "",
+            engine: str = SOCIAL_DISTANCING_VAR_ENGINE, event_driven: bool = True, seed: Optional[int] = None,
+            output: str = SOCIAL_DISTANCING_VAR_OUTPUT, world: Optional[str] = None, shared_world: bool = False,
+            early_stop: bool = True):
+        self.metrics = SimulatorMetrics(self.simulations, retries=self.retries,
+                                        progress_interval=self.progress_interval, stream=self.metrics_path)
+        with self._world(world, shared_world, seed) as world:
+            items = self._items(self.simulations, days=days, risky_interactions=risky_interactions,
+                                output_path=output_path, engine=engine, event_driven=event_driven, seed=seed,
+                                output=output, world=world, early_stop=early_stop)
+            with self._writer() as writer:
+                if self.backend == SOCIAL_DISTANCING_TAG_BACKEND_PROCESS:
+                    self._run_processes(items, writer)
+                else:
+                    self._run_threads(items, writer)
+        self.metrics.report(event="summary")
+        return self.metrics.summary()
+
+    def run_adaptive(self, tolerance: float, max_simulations: int = 100, metric: str = ConvergenceCriterion.METRIC_MEAN,
+                     confidence: float = 0.95, days: int = 50, risky_interactions: float = 0.05, output_path: str = "",
+                     engine: str = SOCIAL_DISTANCING_VAR_ENGINE, event_driven: bool = True, seed: Optional[int] = None,
+                     output: str = SOCIAL_DISTANCING_VAR_OUTPUT, world: Optional[str] = None,
+                     shared_world: bool = False, early_stop: bool = True) -> ConvergenceCriterion:
+        # Replicates until the confidence interval of the metric is narrower than "tolerance" (at least
+        # "simulations" runs, at most "max_simulations").
+        criterion = ConvergenceCriterion(tolerance=tolerance, metric=metric, confidence=confidence,
+                                         min_runs=self.simulations)
+        self.metrics = SimulatorMetrics(max(max_simulations, criterion.min_runs), retries=self.retries,
+                                        progress_interval=self.progress_interval, stream=self.metrics_path)
+        with self._world(world, shared_world, seed) as world:
+            items = self._items(max(max_simulations, criterion.min_runs), days=days,
+                                risky_interactions=risky_interactions, output_path=output_path, engine=engine,
+                                event_driven=event_driven, seed=seed, output=output, world=world,
+                                early_stop=early_stop)
+            with self._writer() as writer:
+                self._save_results(self._run_adaptive(items, criterion), writer)
+        self.metrics.report(event="summary")
+        logger.info(f"Adaptive simulation {'converged' if criterion.converged else 'stopped'} after "
+                    f"{criterion.runs} runs: {criterion.metric} confidence interval half width "
+                    f"{criterion.half_width:.4g} (tolerance {tolerance})")
+        return criterion
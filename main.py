@@ -1,13 +1,24 @@
+import functools
+import itertools
 import logging
+import multiprocessing
 import uuid
-from typing import Optional
+from typing import List, Optional, Tuple
 
 import fire
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
+from cache import ResultCache
+from catalog import ResultCatalog
+from comparison import Comparison
 from core import Simulator, Simulation
+from metrics import write_json_line
+from models.population import Population
 from settings import *
+from stats import ConfirmedAggregator, ConvergenceCriterion
+from sweep import Sweep
+from storage import confirmed_frame, get_format_from_filename, read_daily_infected_cases
 from utils import list_dir
 
 logger = logging.getLogger(__name__)
@@ -20,51 +31,184 @@ class Main:
         return "\n".join(f"* {strategy}" for strategy in SOCIAL_DISTANCING_VAR_STRATEGIES)
 
     @staticmethod
-    def simulate(days=100, show=False, filename=""):
-        simulation = Simulation(days=days)
+    def simulate(days=100, show=False, filename="", engine=SOCIAL_DISTANCING_VAR_ENGINE, event_driven=True, seed=None,
+                 output=SOCIAL_DISTANCING_VAR_OUTPUT, world="", early_stop=True, progress_interval=0, metrics_path=""):
+        simulation = Simulation.from_engine(engine=engine, days=days, event_driven=event_driven, seed=seed,
+                                            output=output, population=Population.load(world) if world else None,
+                                            early_stop=early_stop, progress_interval=progress_interval,
+                                            metrics_path=metrics_path or None)
         results_confirmed, results_interactions = simulation.run()
-        df = pd.DataFrame(results_confirmed)
-        df["day"] = [int(t / 100) for t in df.time]
+        write_json_line(metrics_path, {"event": "run", "metrics": simulation.metrics.summary()})
+        if simulation.metadata["stopped_at"] is not None:
+            logger.info(f"Stopped early on tick {simulation.metadata['stopped_at']}: "
+                        f"{simulation.metadata['absorbing_state']}")
+        df = confirmed_frame(results_confirmed)
         if show:
+            import matplotlib.pyplot as plt
             df.groupby("day")["infected_cases"].max().reset_index().plot(x="day", y="infected_cases")
             plt.title("Confirmed cases")
             plt.xlabel("Days since first case")
             plt.ylabel("Infected people")
             plt.show()
-        if filename.endswith(".csv"):
-            df.to_csv(filename, index=False)
+        result_format = get_format_from_filename(filename)
+        if result_format is not None:
+            result_format.write(df, filename)
 
     @staticmethod
-    def simulate_multiple(name: str = "", simulations: int = 1, days: int = 100, show: bool = False):
+    def simulate_multiple(name: str = "", simulations: int = 1, days: int = 100, show: bool = False,
+                          engine: str = SOCIAL_DISTANCING_VAR_ENGINE, event_driven: bool = True,
+                          njobs: int = -1, backend: str = SOCIAL_DISTANCING_VAR_BACKEND, chunksize: int = 1,
+                          seed: Optional[int] = None, cache: bool = True,
+                          output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT, batch_size: int = 1,
+                          output: str = SOCIAL_DISTANCING_VAR_OUTPUT, world: str = "", shared_world: bool = False,
+                          tolerance: Optional[float] = None, max_simulations: int = 100,
+                          metric: str = ConvergenceCriterion.METRIC_MEAN, confidence: float = 0.95,
+                          early_stop: bool = True, progress_interval: float = 0, metrics_path: str = "",
+                          retries: int = 2):
         output_id = str(uuid.uuid4()) if not name else name
-        simulator = Simulator(simulations=simulations)
-        simulator.run(days=days, output_path=output_id)
+        simulator = Simulator(simulations=simulations, njobs=njobs, backend=backend, chunksize=chunksize, cache=cache,
+                              output_format=output_format, batch_size=batch_size, progress_interval=progress_interval,
+                              metrics_path=metrics_path or None, retries=retries)
+        if tolerance is not None:
+            # Adaptive: "simulations" is the minimum number of runs.
+            simulator.run_adaptive(tolerance=tolerance, max_simulations=max_simulations, metric=metric,
+                                   confidence=confidence, days=days, output_path=output_id, engine=engine,
+                                   event_driven=event_driven, seed=seed, output=output, world=world or None,
+                                   shared_world=shared_world, early_stop=early_stop)
+        else:
+            simulator.run(days=days, output_path=output_id, engine=engine, event_driven=event_driven, seed=seed,
+                          output=output, world=world or None, shared_world=shared_world, early_stop=early_stop)
         if show:
             Main.analyze(simulation_name=name, show=True)
+        summary = simulator.metrics.summary()
+        return f"{summary['completed']} runs completed ({summary['failed']} failed, {summary['retried']} retried) " \
+               f"on {output_id}, {summary['runs_per_second']:.2f} runs/s"
 
     @staticmethod
-    def _get_concat_confirmed_df(simulation_name: str):
-        csv_files = [filename for filename in list_dir(simulation_name) if filename.endswith(".csv")]
-        confirmed = pd.concat(
-            [
-                (
-                    pd.read_csv(filename)
-                    .groupby("day")["infected_cases"].max().reset_index()
-                    .assign(strategy="distancing" if "distancing" in filename else "interacting")
-                )
-                for filename in csv_files
-                if "confirmed" in filename
-            ]
-        )
-        return confirmed
+    def sweep(name: str, strategies=None, populations=None, risky_interactions=0.05, days=100, replicates: int = 1,
+              homes=None, workplaces=None, universities=None, public_places=None, configurations: str = "",
+              engine: str = SOCIAL_DISTANCING_VAR_ENGINE, event_driven: bool = True, njobs: int = -1,
+              backend: str = SOCIAL_DISTANCING_VAR_BACKEND, seed: Optional[int] = None, cache: bool = True,
+              output: str = SOCIAL_DISTANCING_VAR_OUTPUT, output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT,
+              early_stop: bool = True, retries: int = 2):
+        # Fire parses "--populations 1000,10000" as a tuple (and strategies as a string): every given axis is part of
+        # the grid.
+        if configurations:
+            with open(configurations, "r") as file:
+                grid = json.loads(file.read())
+        else:
+            axes = {
+                "strategy": strategies.split(",") if isinstance(strategies, str) else strategies,
+                "population": populations,
+                "risky_interactions": risky_interactions,
+                "days": days,
+                "factory_num_homes": homes,
+                "factory_num_workplace": workplaces,
+                "factory_num_university": universities,
+                "factory_num_public": public_places
+            }
+            grid = Sweep.grid(**{k: v for k, v in axes.items() if v is not None})
+        sweep = Sweep(configurations=grid, days=days, risky_interactions=risky_interactions, replicates=replicates,
+                      engine=engine, event_driven=event_driven, output=output, njobs=njobs, backend=backend,
+                      cache=cache, output_format=output_format, early_stop=early_stop, retries=retries)
+        summary = sweep.run(path=name, seed=seed)
+        return f"{summary['runs']} runs ({summary['skipped']} already completed, {summary['failed']} failed) " \
+               f"on {name}, seed {summary['seed']}"
+
+    @staticmethod
+    def compare(name: str, strategies=None, replicates: int = 1, days: int = 100, risky_interactions: float = 0.05,
+                population: Optional[int] = None, engine: str = SOCIAL_DISTANCING_VAR_ENGINE,
+                event_driven: bool = True, njobs: int = -1, backend: str = SOCIAL_DISTANCING_VAR_BACKEND,
+                seed: Optional[int] = None, output: str = SOCIAL_DISTANCING_VAR_OUTPUT,
+                output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT, early_stop: bool = True,
+                confidence: float = 0.95, show: bool = False):
+        comparison = Comparison(strategies=strategies.split(",") if isinstance(strategies, str) else strategies,
+                                replicates=replicates, days=days, risky_interactions=risky_interactions,
+                                engine=engine, event_driven=event_driven, output=output, njobs=njobs, backend=backend,
+                                output_format=output_format, early_stop=early_stop, confidence=confidence,
+                                **({"population": population} if population is not None else {}))
+        summary = comparison.run(path=name, seed=seed)
+        if show:
+            Main.analyze(simulation_name=name, show=True)
+        lines = [f"{summary['replicates'] - summary['failed']} pairs ({summary['failed']} failed) on {name}, "
+                 f"seed {summary['seed']}"]
+        for strategy, differences in summary["differences"].items():
+            for metric, difference in differences.items():
+                lines.append(f"{strategy} - {summary['reference']}, {metric}: {difference['mean']:.1f} "
+                             f"± {difference['half_width']:.1f} (independent runs: "
+                             f"± {difference['unpaired_half_width']:.1f})")
+        return "\n".join(lines)
+
+    @staticmethod
+    def build_world(path: str, seed: Optional[int] = None):
+        population = Population.create(rng=np.random.default_rng(seed)).save(path)
+        return f"{population} saved on {path} (world {population.world_id})"
+
+    @staticmethod
+    def cache(prune: bool = False, clear: bool = False, max_size: Optional[float] = None):
+        result_cache = ResultCache()
+        if clear:
+            logger.info(f"Removed {len(result_cache.clear())} cached results")
+        elif prune or max_size is not None:
+            logger.info(f"Removed {len(result_cache.prune(max_size=max_size))} cached results")
+        return result_cache.describe()
+
+    @staticmethod
+    def catalog(simulation_name: str, rebuild: bool = False):
+        result_catalog = ResultCatalog(simulation_name)
+        if rebuild:
+            logger.info(f"Cataloged {result_catalog.rebuild()} runs")
+        return result_catalog.describe()
+
+    @staticmethod
+    def _aggregate_confirmed(files: List[Tuple[str, str]], quantile_bins: int = 0):
+        aggregator = ConfirmedAggregator(quantile_bins=quantile_bins)
+        for filename, strategy in files:
+            for daily_infected_cases in read_daily_infected_cases(filename):
+                aggregator.add(strategy, daily_infected_cases)
+        return aggregator
+
+    @staticmethod
+    def _get_confirmed_files(simulation_name: str) -> List[Tuple[str, str]]:
+        # (confirmed results file, strategy) of every run, from the catalog. Results saved before the catalog existed
+        # are found walking the directory, with the strategy given by the file path (its directory).
+        result_catalog = ResultCatalog(simulation_name)
+        if result_catalog.exists:
+            return result_catalog.files(kind="confirmed")
+        logger.warning(f"No catalog on {simulation_name}, scanning the directory (build it with `catalog --rebuild`)")
+        return [
+            (filename, strategy) for filename in list_dir(simulation_name)
+            if get_format_from_filename(filename) and "confirmed" in filename
+            for strategy in SOCIAL_DISTANCING_VAR_STRATEGIES if strategy in filename.split(os.sep)
+        ]
+
+    @staticmethod
+    def _get_confirmed_stats(simulation_name: str, njobs: int = 1, chunksize: int = 100, quantile_bins: int = 0):
+        files = Main._get_confirmed_files(simulation_name)
+        # Runs are folded into running aggregates one file at a time, memory doesn't grow with the number of runs.
+        if njobs == 1:
+            return Main._aggregate_confirmed(files, quantile_bins=quantile_bins)
+        aggregator = ConfirmedAggregator(quantile_bins=quantile_bins)
+        chunks = [files[i:i + chunksize] for i in range(0, len(files), chunksize)]
+        with multiprocessing.Pool(processes=njobs if njobs > 0 else None) as pool:
+            for partial in pool.imap_unordered(
+                    functools.partial(Main._aggregate_confirmed, quantile_bins=quantile_bins), chunks):
+                aggregator.merge(partial)
+        return aggregator
 
     @staticmethod
     def analyze(simulation_name: str,
-                days: Optional[int] = None, avg_days: int = 10, show: bool = False, save: str = ""):
-        confirmed = Main._get_concat_confirmed_df(simulation_name)
-        max_day = days if days is not None else confirmed.day.max()
-        confirmed_avg = confirmed.query(f"day <= {max_day}")\
-            .groupby(["day", "strategy"])["infected_cases"].mean().reset_index()
+                days: Optional[int] = None, avg_days: int = 10, show: bool = False, save: str = "",
+                njobs: int = 1, quantiles: Optional[List[float]] = None, quantile_bins: int = 1000,
+                save_stats: str = ""):
+        quantiles = [quantiles] if isinstance(quantiles, float) else list(quantiles or [])
+        confirmed_stats = Main._get_confirmed_stats(
+            simulation_name, njobs=njobs, quantile_bins=quantile_bins if quantiles else 0).to_frame(quantiles)
+        max_day = days if days is not None else confirmed_stats.day.max()
+        confirmed_stats = confirmed_stats.query(f"day <= {max_day}").query("runs > 0")
+        if save_stats.endswith(".csv"):
+            confirmed_stats.to_csv(save_stats, index=False)
+        confirmed_avg = confirmed_stats[["day", "strategy", "infected_cases"]]
         # Create confirmed time-series
         confirmed_ts = pd.DataFrame({"day": confirmed_avg.day.unique()})
         for strategy in confirmed_avg.strategy.unique():
@@ -75,31 +219,31 @@ class Main:
                 .set_index("day")
             )).reset_index()
         # Create incremental time-series
+        strategies = list(confirmed_avg.strategy.unique())
         incremental_values = {"day": confirmed_ts.day.values}
-        for col in ["distancing", "interacting"]:
+        for col in strategies:
             values = confirmed_ts[col].values
             incremental_values[col] = [0] + list(values[1:] - values[:-1])
         incremental_ts = pd.DataFrame(incremental_values)
         # Add average to incremental time-series
         incremental_ts = incremental_ts.assign(group=round(incremental_ts.day / avg_days))
-        incremental_ts = incremental_ts.groupby("group")[["interacting", "distancing"]].mean().rename(columns={
-            "interacting": "avg-interacting",
-            "distancing": "avg-distancing"
+        incremental_ts = incremental_ts.groupby("group")[strategies].mean().rename(columns={
+            strategy: f"avg-{strategy}" for strategy in strategies
         }).join(incremental_ts.set_index("group"), how="right").reset_index(drop=True)
-        # Plot results!
+        # Plot results! (pyplot is only imported by the commands that plot, it dominates the startup time)
+        import matplotlib.pyplot as plt
         fig = plt.figure(figsize=(10, 6))
-        plt.suptitle("Confirmed Cases: Normal Social Interactions VS Social Distancing")
+        plt.suptitle(f"Confirmed Cases: {' VS '.join(strategies)}")
         ax_upper = plt.subplot(211)
         confirmed_ts.plot(x="day", ax=ax_upper)
         plt.ylabel("Total Confirmed Cases")
         plt.grid()
         ax_lower = plt.subplot(212)
-        incremental_ts.plot(x="day", y="avg-interacting", color="orange", ax=ax_lower, label="avg-interacting")
-        incremental_ts.plot(x="day", y="avg-distancing", color="blue", ax=ax_lower, label="avg-distancing")
-        incremental_ts.plot.scatter(x="day", y="interacting", color="orange",
-                                    alpha=0.3, label="interacting", ax=ax_lower)
-        incremental_ts.plot.scatter(x="day", y="distancing", color="blue",
-                                    alpha=0.3, label="distancing", ax=ax_lower)
+        # Same color for each strategy on both plots.
+        colors = itertools.cycle(plt.rcParams["axes.prop_cycle"].by_key()["color"])
+        for strategy, color in zip(strategies, colors):
+            incremental_ts.plot(x="day", y=f"avg-{strategy}", color=color, ax=ax_lower, label=f"avg-{strategy}")
+            incremental_ts.plot.scatter(x="day", y=strategy, color=color, alpha=0.3, label=strategy, ax=ax_lower)
         plt.ylabel("New Confirmed Cases")
         plt.grid()
         if show:
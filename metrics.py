@@ -0,0 +1,218 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from results import PlaceTypes
+
+logger = logging.getLogger(__name__)
+
+
+def write_json_line(path: Optional[str], record: dict):
+    # Small appends: lines written by several workers on the same stream don't interleave.
+    if path:
+        with open(path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+class SimulationMetrics:
+    # Where the time of a simulation goes: seconds per phase and per step of 10 ticks, plus the group size histogram
+    # of each place type on interaction ticks. Optionally reported every "progress_interval" seconds (log and stream).
+    PHASES = ["schedule", "places", "interactions", "results", "early_stop"]
+    # Group sizes on powers of two: 1, 2-3, 4-7, ...
+    GROUP_SIZE_BINS = 32
+
+    def __init__(self, days: int, item_id: str, place_keys: Optional[Sequence[str]] = None, step: int = 10,
+                 progress_interval: float = 0, stream: Optional[str] = None):
+        # Step: ticks covered by each loop iteration (10 when event-driven).
+        self.days = days
+        self.step = step
+        self.item_id = item_id
+        self.progress_interval = progress_interval
+        self.stream = stream
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.tick_seconds = np.zeros(days * 10)
+        self.group_sizes = np.zeros((len(PlaceTypes.NAMES), self.GROUP_SIZE_BINS), dtype=np.int64)
+        self._place_types = PlaceTypes(place_keys)
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None
+        self.t = 0
+        self._reported = self.started
+
+    def __repr__(self):
+        return f"SimulationMetrics(item_id={self.item_id}, days={self.days_simulated:.1f}/{self.days})"
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def add_groups(self, places: Sequence, sizes: Sequence[int]):
+        bins = np.minimum(np.log2(np.maximum(np.asarray(sizes, dtype=np.float64), 1)).astype(np.int64),
+                          self.GROUP_SIZE_BINS - 1)
+        self.group_sizes += np.bincount(self._place_types(places) * self.GROUP_SIZE_BINS + bins,
+                                        minlength=self.group_sizes.size).reshape(self.group_sizes.shape)
+
+    def add_tick(self, t: int, start: float, infected_cases: int):
+        now = time.perf_counter()
+        self.tick_seconds[t // 10] += now - start
+        self.t = t + self.step
+        if self.progress_interval and now - self._reported >= self.progress_interval:
+            self._reported = now
+            self.report(infected_cases)
+
+    def end(self):
+        self.ended = time.perf_counter()
+
+    @property
+    def seconds(self) -> float:
+        return (self.ended if self.ended is not None else time.perf_counter()) - self.started
+
+    @property
+    def days_simulated(self) -> float:
+        return self.t / 100
+
+    @property
+    def sim_days_per_second(self) -> float:
+        return self.days_simulated / self.seconds if self.seconds else 0.0
+
+    def report(self, infected_cases: int):
+        logger.info(f"Simulation {self.item_id}: day {self.days_simulated:.1f}/{self.days}, "
+                    f"{infected_cases} infected, {self.sim_days_per_second:.2f} sim-days/s")
+        write_json_line(self.stream, {
+            "event": "progress",
+            "item_id": self.item_id,
+            "days": self.days_simulated,
+            "infected_cases": infected_cases,
+            "seconds": self.seconds,
+            "sim_days_per_second": self.sim_days_per_second
+        })
+
+    def summary(self) -> dict:
+        steps = self.tick_seconds[:int(np.ceil(self.t / 10))]
+        return {
+            "seconds": self.seconds,
+            "days": self.days_simulated,
+            "sim_days_per_second": self.sim_days_per_second,
+            "phases": dict(self.phases),
+            # Seconds per step of 10 ticks (one interaction tick and the ticks before the next one).
+            "tick_seconds": {
+                "mean": float(steps.mean()) if len(steps) else 0.0,
+                "p95": float(np.percentile(steps, 95)) if len(steps) else 0.0,
+                "max": float(steps.max()) if len(steps) else 0.0
+            },
+            # Interaction ticks with a group of 1, 2-3, 4-7, ... people on each place type.
+            "group_sizes": {
+                name: histogram[:np.flatnonzero(histogram).max() + 1].tolist() if histogram.any() else []
+                for name, histogram in zip(PlaceTypes.NAMES, self.group_sizes)
+            }
+        }
+
+
+class SimulatorMetrics:
+    # Status of every run (completed, retrying or failed, with its attempts) and simulated days per second of each
+    # worker, reported every "progress_interval" seconds. A failed run is retried up to "retries" times.
+    # Updated by the parent (process workers) or by the workers themselves (threads).
+    STATUS_COMPLETED = "completed"
+    STATUS_RETRYING = "retrying"
+    STATUS_FAILED = "failed"
+
+    def __init__(self, simulations: int, retries: int = 0, progress_interval: float = 0, stream: Optional[str] = None):
+        self.simulations = simulations
+        self.retries = retries
+        self.progress_interval = progress_interval
+        self.stream = stream
+        self.workers: Dict[str, dict] = {}
+        self.runs: Dict[str, dict] = {}
+        # Failed attempts that were scheduled again.
+        self.retried = 0
+        self.started = time.perf_counter()
+        self._reported = self.started
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"SimulatorMetrics(completed={self.count(self.STATUS_COMPLETED)}/{self.simulations}, " \
+               f"failed={self.count(self.STATUS_FAILED)})"
+
+    def _worker(self, worker_id: str) -> dict:
+        return self.workers.setdefault(worker_id, {"runs": 0, "cached": 0, "failed": 0, "days": 0.0, "seconds": 0.0})
+
+    def _run(self, item_id: str) -> dict:
+        return self.runs.setdefault(item_id, {"status": None, "attempts": 0, "worker_id": None, "error": None})
+
+    def count(self, status: str) -> int:
+        return sum(run["status"] == status for run in self.runs.values())
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add(self, worker_id: str, item_id: str, metadata: dict):
+        # Runs reused from the cache carry no metrics: they count as done but not as simulated days.
+        metrics = metadata.get("metrics")
+        with self._lock:
+            run = self._run(item_id)
+            run.update(status=self.STATUS_COMPLETED, attempts=run["attempts"] + 1, worker_id=worker_id)
+            worker = self._worker(worker_id)
+            worker["runs"] += 1
+            if metrics is None:
+                worker["cached"] += 1
+            else:
+                worker["days"] += metrics["days"]
+                worker["seconds"] += metrics["seconds"]
+            write_json_line(self.stream, {"event": "run", "worker_id": worker_id, "item_id": item_id,
+                                          "metrics": metrics})
+            self._progress()
+
+    def add_failure(self, worker_id: str, item_id: str, error: str) -> bool:
+        # Whether the run should be scheduled again.
+        with self._lock:
+            run = self._run(item_id)
+            retry = run["attempts"] < self.retries
+            run.update(status=self.STATUS_RETRYING if retry else self.STATUS_FAILED, attempts=run["attempts"] + 1,
+                       worker_id=worker_id, error=error)
+            self.retried += retry
+            self._worker(worker_id)["failed"] += 1
+            write_json_line(self.stream, {"event": "failure", "worker_id": worker_id, "item_id": item_id,
+                                          "attempt": run["attempts"], "retry": retry, "error": error})
+            self._progress()
+            return retry
+
+    def _progress(self):
+        now = time.perf_counter()
+        if self.progress_interval and now - self._reported >= self.progress_interval:
+            self._reported = now
+            self.report()
+
+    def report(self, event: str = "progress"):
+        summary = self.summary()
+        logger.info(f"Simulator: {summary['completed']}/{self.simulations} runs completed ({summary['failed']} "
+                    f"failed, {summary['retried']} retried) in {summary['seconds']:.1f}s, "
+                    f"{summary['sim_days_per_second']:.2f} sim-days/s on {len(self.workers)} workers")
+        write_json_line(self.stream, {"event": event, **summary})
+
+    def summary(self) -> dict:
+        days = sum(worker["days"] for worker in self.workers.values())
+        return {
+            "completed": self.count(self.STATUS_COMPLETED),
+            "failed": self.count(self.STATUS_FAILED),
+            "retried": self.retried,
+            "seconds": self.seconds,
+            # Wall clock throughput of the whole pool, and simulation time throughput of each worker.
+            "runs_per_second": self.count(self.STATUS_COMPLETED) / self.seconds if self.seconds else 0.0,
+            "sim_days_per_second": days / self.seconds if self.seconds else 0.0,
+            "workers": {
+                worker_id: {**worker, "sim_days_per_second": worker["days"] / worker["seconds"] if worker["seconds"]
+                            else 0.0}
+                for worker_id, worker in self.workers.items()
+            },
+            "errors": {item_id: run["error"] for item_id, run in self.runs.items()
+                       if run["status"] == self.STATUS_FAILED}
+        }
@@ -0,0 +1,49 @@
+from typing import Dict, List
+
+from models.person import Person
+from models.place import Place
+
+
+class Occupancy:
+
+    def __init__(self):
+        self.groups: Dict[str, List[Person]] = {}
+        self.infected: Dict[str, int] = {}
+        self.infected_cases = 0
+        self._location: Dict[Person, str] = {}
+        self._index: Dict[Person, int] = {}
+
+    def __repr__(self):
+        return f"Occupancy(places={len(self.groups)}, infected_cases={self.infected_cases})"
+
+    def _remove(self, person: Person, key: str):
+        group = self.groups[key]
+        # Swap with the last member so removal doesn't shift the rest of the group.
+        index = self._index.pop(person)
+        last = group.pop()
+        if last is not person:
+            group[index] = last
+            self._index[last] = index
+        if person.infected:
+            self.infected[key] -= 1
+        if not group:
+            del self.groups[key]
+            del self.infected[key]
+
+    def move(self, person: Person, place: Place):
+        previous = self._location.get(person)
+        if previous == place.key:
+            return
+        if previous is None:
+            self.infected_cases += person.infected
+        else:
+            self._remove(person, previous)
+        group = self.groups.setdefault(place.key, [])
+        self._index[person] = len(group)
+        self._location[person] = place.key
+        group.append(person)
+        self.infected[place.key] = self.infected.get(place.key, 0) + person.infected
+
+    def infect(self, person: Person):
+        self.infected[self._location[person]] += 1
+        self.infected_cases += 1
@@ -1,32 +1,35 @@
 import random
-from typing import List
+from typing import List, Optional
 
+from config import SimulationConfig
 from models.route import Route, Routes
 from models.place import Place
 
 
 class Person(object):
+    __slots__ = ("routes", "infected", "history")
 
     def __init__(self, routes: Routes, infected: bool = False):
         self.routes = routes
         self.infected = infected
-        self.history: List[Route] = []
+        # Index of the route template followed each day.
+        self.history: List[int] = []
 
     @property
     def days(self):
         return len(self.history)
 
-    def get_route(self, t):
+    def get_route_index(self, t, rng: random.Random = random) -> int:
         day = int(t / 100) + 1
         if day > self.days:
-            route, = self.routes.random_choices(k=1)
-            self.history.append(route)
-            return route
+            self.history.append(self.routes.random_index(rng))
         return self.history[-1]
 
-    def position(self, t: int) -> Place:
-        route = self.get_route(t)
-        return route.get_place(t % 100)
+    def get_route(self, t, rng: random.Random = random) -> Route:
+        return self.routes.get_route(self.get_route_index(t, rng=rng))
+
+    def position(self, t: int, rng: random.Random = random) -> Place:
+        return self.routes.get_place(self.get_route_index(t, rng=rng), t % 100)
 
     def interact(self, other: 'Person'):
         if other.infected:
@@ -38,35 +41,44 @@ class Person(object):
 class PersonFactory:
 
     @staticmethod
-    def _infect(group: List[Person], cases: int):
-        for person in random.choices(population=group, k=cases):
+    def _infect(group: List[Person], cases: int, rng: random.Random = random):
+        for person in rng.choices(population=group, k=cases):
             person.infected = True
         return group
 
     @staticmethod
-    def create_people(k, route_function, infected_cases=0):
+    def create_people(k, route_function, infected_cases=0, rng: random.Random = random,
+                      config: Optional[SimulationConfig] = None):
         people = [
-            Person(routes=route_function(), infected=False)
+            Person(routes=route_function(rng, config=config), infected=False)
             for _ in range(k)
         ]
-        return PersonFactory._infect(people, infected_cases) if infected_cases else people
+        return PersonFactory._infect(people, infected_cases, rng=rng) if infected_cases else people
 
     @staticmethod
-    def create_people_with_route_student(k=1, infected_cases=0):
+    def create_people_with_route_student(k=1, infected_cases=0, rng: random.Random = random,
+                                         config: Optional[SimulationConfig] = None):
         route_function = Routes.get_routes_worker_student
-        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases)
+        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases, rng=rng,
+                                           config=config)
 
     @staticmethod
-    def create_people_with_route_worker(k=1, infected_cases=0):
+    def create_people_with_route_worker(k=1, infected_cases=0, rng: random.Random = random,
+                                        config: Optional[SimulationConfig] = None):
         route_function = Routes.get_routes_worker
-        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases)
+        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases, rng=rng,
+                                           config=config)
 
     @staticmethod
-    def create_people_with_route_worker_student(k=1, infected_cases=0):
+    def create_people_with_route_worker_student(k=1, infected_cases=0, rng: random.Random = random,
+                                                config: Optional[SimulationConfig] = None):
         route_function = Routes.get_routes_worker_student
-        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases)
+        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases, rng=rng,
+                                           config=config)
 
     @staticmethod
-    def create_people_with_route_stay_home(k=1, infected_cases=0):
+    def create_people_with_route_stay_home(k=1, infected_cases=0, rng: random.Random = random,
+                                           config: Optional[SimulationConfig] = None):
         route_function = Routes.get_routes_stay_home
-        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases)
+        return PersonFactory.create_people(k=k, route_function=route_function, infected_cases=infected_cases, rng=rng,
+                                           config=config)
@@ -1,15 +1,24 @@
 import random
 import uuid
+from typing import List
 
-from settings import *
+import numpy as np
 
 
 class Place:
+    __slots__ = ("id", "name", "_key")
 
     def __init__(self, name, obj_id=None):
         self.id = obj_id if obj_id is not None else str(uuid.uuid4())
         self.name = name
-        self.key = f"{name}-{self.id}"
+        self._key = None
+
+    @property
+    def key(self):
+        # Formatted on first use only, most places never need it.
+        if self._key is None:
+            self._key = f"{self.name}-{self.id}"
+        return self._key
 
     def __repr__(self):
         return f"Place(id={self.id}, name={self.name})"
@@ -24,13 +33,22 @@ class PlaceFactory:
         TAG_UNIVERSITY = "university"
         TAG_PUBLIC = "public"
 
-    def __init__(self, name, n_options):
+    def __init__(self, name, n_options, register=True):
         self.name = name
-        self.options = [
-            Place(obj_id=i, name=self.name)
-            for i in range(n_options)
-        ]
-        PlaceFactory.VALUES[name] = self
+        self._n_options = n_options
+        self._options = None
+        if register:
+            PlaceFactory.VALUES[name] = self
+
+    @property
+    def options(self):
+        # Place objects are only built when needed (the numpy engine works with integer ids).
+        if self._options is None:
+            self._options = [
+                Place(obj_id=i, name=self.name)
+                for i in range(self._n_options)
+            ]
+        return self._options
 
     def add_option(self, place: Place):
         self.options.append(place)
@@ -39,15 +57,15 @@ class PlaceFactory:
     def get_option(self, place_id):
         return self.options[place_id]
 
-    def get_random_place(self):
-        return random.choice(self.options)
+    def get_random_place(self, rng: random.Random = random):
+        return rng.choice(self.options)
 
-    def get_random_places(self, n):
-        return random.choices(self.options, k=n)
+    def get_random_places(self, n, rng: random.Random = random):
+        return rng.choices(self.options, k=n)
 
     @property
     def n_options(self):
-        return len(self.options)
+        return len(self._options) if self._options is not None else self._n_options
 
     @staticmethod
     def get_or_create(name, n_options=None):
@@ -58,19 +76,25 @@ class PlaceFactory:
         raise ValueError("")
 
 
-PLACE_FACTORY_HOME = PlaceFactory(
-    name=PlaceFactory.CHOICE.TAG_HOME,
-    n_options=SOCIAL_DISTANCING_VAR_FACTORY_NUM_HOMES
-)
-PLACE_FACTORY_WORKPLACE = PlaceFactory(
-    name=PlaceFactory.CHOICE.TAG_WORKPLACE,
-    n_options=SOCIAL_DISTANCING_VAR_FACTORY_NUM_WORKPLACE
-)
-PLACE_FACTORY_UNIVERSITY = PlaceFactory(
-    name=PlaceFactory.CHOICE.TAG_UNIVERSITY,
-    n_options=SOCIAL_DISTANCING_VAR_FACTORY_NUM_UNIVERSITY
-)
-PLACE_FACTORY_PUBLIC = PlaceFactory(
-    name=PlaceFactory.CHOICE.TAG_PUBLIC,
-    n_options=SOCIAL_DISTANCING_VAR_FACTORY_NUM_PUBLIC
-)
+class PlaceTable:
+    # Integer ids for the places of several factories, laid out one factory after the other.
+
+    def __init__(self, factories: List[PlaceFactory]):
+        self.factories = factories
+        sizes = [factory.n_options for factory in factories]
+        self.offsets = {factory.name: offset for factory, offset in zip(factories, np.cumsum([0] + sizes[:-1]))}
+        self.factory_ids = np.repeat(np.arange(len(factories), dtype=np.int8), sizes)
+
+    def __repr__(self):
+        return f"PlaceTable(places={len(self)})"
+
+    def __len__(self):
+        return len(self.factory_ids)
+
+    def __getitem__(self, place_id: int) -> str:
+        factory = self.factories[self.factory_ids[place_id]]
+        return f"{factory.name}-{place_id - self.offsets[factory.name]}"
+
+    @property
+    def names(self) -> List[str]:
+        return [factory.name for factory in self.factories]
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import SimulationConfig
+from models.person import Person
+from models.place import PlaceTable
+from models.route import ROUTE_ARCHETYPES, RouteArchetype, Routes
+
+
+class Population:
+    # People stored as arrays: the place (local id on its factory) filling each slot of their route archetype.
+    INTERACTION_TICKS = np.arange(0, 100, 10)
+    # Config a snapshot must be loaded with: the strategy and people-distribution its groups were drawn for.
+    SNAPSHOT_CONFIG = [
+        "SOCIAL_DISTANCING_VAR_POPULATION",
+        "SOCIAL_DISTANCING_VAR_STRATEGY",
+        "SOCIAL_DISTANCING_VAR_PERCENT_STUDENTS",
+        "SOCIAL_DISTANCING_VAR_PERCENT_WORKERS",
+        "SOCIAL_DISTANCING_VAR_PERCENT_WORKER_STUDENTS",
+        "SOCIAL_DISTANCING_VAR_PERCENT_STAY_HOME"
+    ]
+
+    def __init__(self, groups: List[Tuple[str, int, int]], places: np.ndarray, config: SimulationConfig,
+                 world_id: Optional[str] = None, route_table: Optional[np.ndarray] = None,
+                 person_routes: Optional[np.ndarray] = None, person_ids: Optional[np.ndarray] = None,
+                 world_size: Optional[int] = None):
+        # Groups: (archetype name, number of people, initial infected cases), laid out one after the other.
+        self.groups = [(name, int(size), int(infected_cases)) for name, size, infected_cases in groups]
+        self.places = places
+        self.config = config
+        self._world_id = world_id
+        self._route_tables = (route_table, person_routes) if route_table is not None else None
+        # Paired populations (see "create_paired"): the person of the shared world on each row.
+        self.person_ids = person_ids
+        self.world_size = world_size if world_size is not None else len(places)
+
+    def __repr__(self):
+        return f"Population(people={len(self)}, groups={len(self.groups)})"
+
+    def __len__(self):
+        return len(self.places)
+
+    @property
+    def group_ranges(self) -> List[Tuple[RouteArchetype, int, int, int]]:
+        ranges = []
+        start = 0
+        for name, size, infected_cases in self.groups:
+            ranges.append((ROUTE_ARCHETYPES[name], start, start + size, infected_cases))
+            start += size
+        return ranges
+
+    def members(self) -> List[Tuple[RouteArchetype, np.ndarray]]:
+        members = {}
+        for archetype, start, stop, _ in self.group_ranges:
+            members.setdefault(archetype, []).append(np.arange(start, stop))
+        return [(archetype, np.concatenate(indexes)) for archetype, indexes in members.items()]
+
+    def infect(self, rng: np.random.Generator) -> np.ndarray:
+        infected = np.zeros(len(self), dtype=bool)
+        # Paired populations draw a priority for every person of the shared world: the same people are infected on
+        # every scenario as long as they belong to the same group.
+        priorities = self.uniforms(rng)
+        for _, start, stop, infected_cases in self.group_ranges:
+            if not infected_cases or stop <= start:
+                continue
+            if priorities is not None:
+                infected[start + np.argsort(priorities[start:stop], kind="stable")[:infected_cases]] = True
+            else:
+                # Drawn with replacement, as PersonFactory does.
+                infected[start + rng.integers(stop - start, size=infected_cases)] = True
+        return infected
+
+    def uniforms(self, rng: np.random.Generator) -> Optional[np.ndarray]:
+        # A uniform draw for each person of a paired population, taken from a draw of the whole shared world (same
+        # stream on every scenario); None otherwise.
+        return rng.random(self.world_size)[self.person_ids] if self.person_ids is not None else None
+
+    def create_people(self, infected: np.ndarray) -> List[Person]:
+        people = []
+        for archetype, start, stop, _ in self.group_ranges:
+            slots = self.config.place_factory_list(archetype.slots)
+            for row, is_infected in zip(self.places[start:stop, :len(slots)].tolist(), infected[start:stop].tolist()):
+                places = tuple(factory.get_option(place_id) for factory, place_id in zip(slots, row))
+                people.append(Person(routes=Routes(archetype=archetype, places=places), infected=is_infected))
+        return people
+
+    def route_tables(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Route table: the place (PlaceTable id) of each unique route on every interaction tick.
+        # Person routes: the route table row of each template of every person.
+        if self._route_tables is not None:
+            return self._route_tables
+        place_table = PlaceTable(self.config.place_factory_list())
+        factory_sizes = self.config.factory_sizes
+        members = self.members()
+        route_table = []
+        person_routes = np.zeros((len(self), max(len(archetype.templates) for archetype, _ in members)),
+                                 dtype=np.int32)
+        for archetype, indexes in members:
+            local_ids = np.asarray(self.places[indexes, :len(archetype.slots)], dtype=np.int64)
+            offsets = np.array([place_table.offsets[name] for name in archetype.slots], dtype=np.int64)
+            place_ids = local_ids + offsets
+            for j, template in enumerate(archetype.templates):
+                # Places are only needed on interaction ticks: each route keeps the slot it visits on each of them.
+                slots, durations = zip(*template.stops)
+                stops = np.searchsorted(np.cumsum(durations), self.INTERACTION_TICKS, side="right")
+                # Identical routes (same places on the template slots) share a single row of the route table; the
+                # slots are folded one at a time into a dense route id to keep every unique one-dimensional.
+                route_ids = np.zeros(len(indexes), dtype=np.int64)
+                for slot in sorted(set(slots)):
+                    keys = route_ids * factory_sizes[archetype.slots[slot]] + local_ids[:, slot]
+                    _, first, route_ids = np.unique(keys, return_index=True, return_inverse=True)
+                person_routes[indexes, j] = sum(len(table) for table in route_table) + route_ids.ravel()
+                route_table.append(place_ids[first][:, np.array(slots)[stops]])
+        self._route_tables = (np.concatenate(route_table).astype(np.int32), person_routes)
+        return self._route_tables
+
+    @property
+    def world_id(self) -> str:
+        if self._world_id is None:
+            content = hashlib.sha256(json.dumps([self.groups, self._factory_sizes(self.config)]).encode("utf-8"))
+            content.update(np.ascontiguousarray(self.places).tobytes())
+            self._world_id = content.hexdigest()
+        return self._world_id
+
+    @staticmethod
+    def _factory_sizes(config: SimulationConfig):
+        return dict(sorted(config.factory_sizes.items()))
+
+    @staticmethod
+    def default_groups(config: SimulationConfig) -> List[Tuple[str, int, int]]:
+        return [
+            # Students follow the worker-student routes, as PersonFactory.create_people_with_route_student.
+            (ROUTE_ARCHETYPES["worker-student"].name, config.students, 0),
+            (ROUTE_ARCHETYPES["worker"].name, config.workers, 1),
+            (ROUTE_ARCHETYPES["worker-student"].name, config.worker_students, 1),
+            (ROUTE_ARCHETYPES["stay-home"].name, config.stay_home, 0)
+        ]
+
+    @staticmethod
+    def create(rng: np.random.Generator, config: Optional[SimulationConfig] = None,
+               groups: Optional[List[Tuple[str, int, int]]] = None) -> 'Population':
+        config = config if config is not None else SimulationConfig.default()
+        groups = groups if groups is not None else Population.default_groups(config)
+        archetypes = [ROUTE_ARCHETYPES[name] for name, _, _ in groups]
+        places = np.full(
+            (sum(size for _, size, _ in groups), max(len(archetype.slots) for archetype in archetypes)),
+            -1,
+            dtype=np.int32
+        )
+        population = Population(groups=groups, places=places, config=config)
+        factory_sizes = config.factory_sizes
+        # Every slot of a group is filled in a single draw.
+        for archetype, start, stop, _ in population.group_ranges:
+            for slot, name in enumerate(archetype.slots):
+                places[start:stop, slot] = rng.integers(factory_sizes[name], size=stop - start)
+        return population
+
+    @staticmethod
+    def _world_slots() -> List[str]:
+        # Place slots of a shared world: as many of each place type as any archetype has.
+        slots = []
+        for archetype in ROUTE_ARCHETYPES.values():
+            for name in dict.fromkeys(archetype.slots):
+                slots.extend([name] * (archetype.slots.count(name) - slots.count(name)))
+        return slots
+
+    @staticmethod
+    def create_paired(rng: np.random.Generator, configs: List[SimulationConfig]) -> List['Population']:
+        # One population per config (scenario) on a single world: every person of the world is drawn a place of each
+        # type once, and keeps their group on every scenario unless the group shrinks, in which case the rest of it
+        # moves to the groups that grow (e.g. the workers that stay home when distancing keep their home).
+        factory_sizes = configs[0].factory_sizes
+        if any(config.factory_sizes != factory_sizes for config in configs):
+            raise ValueError("Paired populations require the same place factories on every config")
+        scenarios = [Population.default_groups(config) for config in configs]
+        world_size = max(sum(size for _, size, _ in groups) for groups in scenarios)
+        slots = Population._world_slots()
+        world = np.stack([rng.integers(factory_sizes[name], size=world_size) for name in slots], axis=1)
+        # Groups of the first scenario on a random order of the world; people left out fill the groups that grow.
+        order = rng.permutation(world_size)
+        bounds = np.cumsum([0] + [size for _, size, _ in scenarios[0]])
+        reference = [order[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        populations = []
+        for config, groups in zip(configs, scenarios):
+            sizes = [size for _, size, _ in groups]
+            spare = list(order[bounds[-1]:])
+            for people, size in zip(reference, sizes):
+                spare.extend(people[size:])
+            members = []
+            for people, size in zip(reference, sizes):
+                missing = max(size - len(people), 0)
+                members.append(np.concatenate([people[:size], np.array(spare[:missing], dtype=order.dtype)]))
+                spare = spare[missing:]
+            archetypes = [ROUTE_ARCHETYPES[name] for name, _, _ in groups]
+            places = np.full((sum(sizes), max(len(archetype.slots) for archetype in archetypes)), -1, dtype=np.int32)
+            start = 0
+            for archetype, people in zip(archetypes, members):
+                # The n-th slot of a place type takes the n-th world slot of that type.
+                columns = [[i for i, name in enumerate(slots) if name == slot][archetype.slots[:j].count(slot)]
+                           for j, slot in enumerate(archetype.slots)]
+                places[start:start + len(people), :len(columns)] = world[people][:, columns]
+                start += len(people)
+            populations.append(Population(groups=groups, places=places, config=config,
+                                          person_ids=np.concatenate(members), world_size=world_size))
+        return populations
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        route_table, person_routes = self.route_tables()
+        np.save(os.path.join(path, "places.npy"), self.places)
+        np.save(os.path.join(path, "route_table.npy"), route_table)
+        np.save(os.path.join(path, "person_routes.npy"), person_routes)
+        with open(os.path.join(path, "population.json"), "w") as file:
+            file.write(json.dumps({
+                "groups": self.groups,
+                "factories": self._factory_sizes(self.config),
+                "config": self.config.to_dict(),
+                "world_id": self.world_id
+            }))
+        return self
+
+    @staticmethod
+    def load(path: str, config: Optional[SimulationConfig] = None, mmap: bool = True) -> 'Population':
+        config = config if config is not None else SimulationConfig.default()
+        with open(os.path.join(path, "population.json"), "r") as file:
+            meta = json.loads(file.read())
+        if meta["factories"] != Population._factory_sizes(config):
+            raise ValueError(f"Population snapshot {path} was created for different place factories: "
+                             f"{meta['factories']}")
+        # The groups are drawn for a strategy and people-distribution: runs on another config would be mislabeled.
+        groups = [tuple(group) for group in meta["groups"]]
+        if groups != Population.default_groups(config):
+            raise ValueError(f"Population snapshot {path} was created for different groups: {groups}")
+        saved, current = meta.get("config", {}), config.to_dict()
+        different = [name for name in Population.SNAPSHOT_CONFIG if name in saved and saved[name] != current[name]]
+        if different:
+            raise ValueError(f"Population snapshot {path} was created for a different config: "
+                             f"{', '.join(f'{name}={saved[name]}' for name in different)}")
+        # Memory-mapped: loading is instant and pages are shared by every process reading the snapshot.
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in ["places", "route_table", "person_routes"]
+            if os.path.exists(os.path.join(path, f"{name}.npy"))
+        }
+        return Population(groups=groups, config=config, world_id=meta["world_id"], **arrays)
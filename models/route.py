@@ -1,17 +1,19 @@
+import bisect
 import itertools
 import random
-from typing import List
-
-from models.place import (
-    Place,
-    PLACE_FACTORY_HOME,
-    PLACE_FACTORY_PUBLIC,
-    PLACE_FACTORY_UNIVERSITY,
-    PLACE_FACTORY_WORKPLACE
-)
+from typing import List, Optional, Tuple
+
+from config import SimulationConfig
+from models.place import Place, PlaceFactory
+
+HOME = PlaceFactory.CHOICE.TAG_HOME
+WORKPLACE = PlaceFactory.CHOICE.TAG_WORKPLACE
+UNIVERSITY = PlaceFactory.CHOICE.TAG_UNIVERSITY
+PUBLIC = PlaceFactory.CHOICE.TAG_PUBLIC
 
 
 class Stop:
+    __slots__ = ("place", "duration")
 
     def __init__(self, place: Place, duration: int):
         self.place = place
@@ -23,6 +25,7 @@ class Stop:
 
 
 class Route:
+    __slots__ = ("weight", "stops", "_starts")
 
     def __init__(self, stops: List[Stop], weight: float = 1):
         self.weight = weight
@@ -30,19 +33,18 @@ class Route:
         time_position_accum = list(itertools.accumulate([stop.duration for stop in stops]))
         if time_position_accum[-1] != 100:
             raise ValueError("Total duration must be 100.")
-        time_position_init = [0] + time_position_accum[:-1]
-        self._position = {
-            start + incr: stop.place
-            for stop, start in zip(stops, time_position_init)
-            for incr in range(stop.duration)
-            }
+        self._starts = (0, *time_position_accum[:-1])
 
     def __repr__(self):
         return f"Route(stops={[s.__repr__() for s in self.stops]})"
 
+    @property
+    def boundaries(self):
+        return [(start, stop.place) for stop, start in zip(self.stops, self._starts)]
+
     def get_place(self, t: int):
-        # TODO: consider calculating the position given a "t" (compute VS memory)
-        return self._position[t]
+        # Bisect the stop starts instead of keeping a tick -> place table (routes have a handful of stops).
+        return self.stops[bisect.bisect_right(self._starts, t) - 1].place
 
     @staticmethod
     def create_home_route(home: Place, weight: float = 1):
@@ -83,161 +85,212 @@ class Route:
         ]
 
 
-class Routes:
+class RouteTemplate:
+    # A route shape whose stops point to the place slots of an archetype instead of concrete places.
+    __slots__ = ("stops", "weight", "_starts")
 
-    def __init__(self, routes: List[Route]):
-        self.routes = routes
+    def __init__(self, stops: List[Tuple[int, int]], weight: float = 1):
+        self.stops = tuple(stops)
+        self.weight = weight
+        time_position_accum = list(itertools.accumulate([duration for _, duration in stops]))
+        if time_position_accum[-1] != 100:
+            raise ValueError("Total duration must be 100.")
+        self._starts = (0, *time_position_accum[:-1])
 
     def __repr__(self):
-        return f"Route(routes={len(self.routes)})"
+        return f"RouteTemplate(stops={self.stops}, weight={self.weight})"
 
-    def append_route(self, route):
-        self.routes.append(route)
-        return self
+    def boundaries(self, places: Tuple[Place, ...]):
+        return [(start, places[slot]) for (slot, _), start in zip(self.stops, self._starts)]
 
-    def random_choices(self, k=1):
-        return random.choices(
-            population=self.routes,
-            weights=[r.weight for r in self.routes],
-            k=k
-        )
+    def get_place(self, places: Tuple[Place, ...], t: int):
+        slot, _ = self.stops[bisect.bisect_right(self._starts, t) - 1]
+        return places[slot]
+
+    def bind(self, places: Tuple[Place, ...]) -> Route:
+        return Route(stops=[Stop(place=places[slot], duration=duration) for slot, duration in self.stops],
+                     weight=self.weight)
 
     @staticmethod
-    def get_routes_student():
-        home = PLACE_FACTORY_HOME.get_random_place()
-        university = PLACE_FACTORY_UNIVERSITY.get_random_place()
-        public_regular = PLACE_FACTORY_PUBLIC.get_random_place()
-        return Routes(
-                routes=[
-                    Route.create_home_route(
-                        home=home,
-                        weight=1
-                    ),
-                    Route.create_home_to_outside_route(
-                        home=home,
-                        outside=university,
-                        outside_duration=60,
-                        weight=3
-                    ),
-                    *Route.create_home_to_public_routes(
-                        home=home,
-                        public_places=[public_regular] + [
-                            PLACE_FACTORY_PUBLIC.get_random_place()
-                            for _ in range(2)
-                        ],
-                        outside_duration=60,
-                        weight=2
-                    ),
-                    Route(
-                        stops=[
-                            Stop(place=home, duration=20),
-                            Stop(place=university, duration=30),
-                            Stop(place=public_regular, duration=30),
-                            Stop(place=home, duration=20)
-                        ],
-                        weight=1
-                    )
-                ]
-            )
+    def create_home_template(home: int, weight: float = 1):
+        return RouteTemplate(stops=[(home, 100)], weight=weight)
 
     @staticmethod
-    def get_routes_worker():
-        home = PLACE_FACTORY_HOME.get_random_place()
-        workplace = PLACE_FACTORY_WORKPLACE.get_random_place()
-        public_regular = PLACE_FACTORY_PUBLIC.get_random_place()
-        return Routes(
-            routes=[
-                Route.create_home_route(
-                    home=home,
-                    weight=1
-                ),
-                Route.create_home_to_outside_route(
-                    home=home,
-                    outside=workplace,
-                    outside_duration=60,
-                    weight=3
-                ),
-                *Route.create_home_to_public_routes(
-                    home=home,
-                    public_places=[public_regular] + [
-                        PLACE_FACTORY_PUBLIC.get_random_place()
-                        for _ in range(2)
-                    ],
-                    outside_duration=60,
-                    weight=1
-                ),
-                Route(
-                    stops=[
-                        Stop(place=home, duration=20),
-                        Stop(place=workplace, duration=30),
-                        Stop(place=public_regular, duration=30),
-                        Stop(place=home, duration=20)
-                    ],
-                    weight=2
-                )
-            ]
+    def create_home_to_outside_template(home: int, outside: int, weight: float, outside_duration: int = 60):
+        stop_home_duration = int(50 - outside_duration / 2)
+        return RouteTemplate(
+            stops=[(home, stop_home_duration), (outside, outside_duration), (home, stop_home_duration)],
+            weight=weight
         )
 
     @staticmethod
-    def get_routes_worker_student():
-        home = PLACE_FACTORY_HOME.get_random_place()
-        workplace = PLACE_FACTORY_WORKPLACE.get_random_place()
-        university = PLACE_FACTORY_UNIVERSITY.get_random_place()
-        public_regular = PLACE_FACTORY_PUBLIC.get_random_place()
-        return Routes(
-                routes=[
-                    Route.create_home_route(
-                        home=home,
-                        weight=1
-                    ),
-                    *Route.create_home_to_public_routes(
-                        home=home,
-                        public_places=[public_regular] + [
-                            PLACE_FACTORY_PUBLIC.get_random_place()
-                            for _ in range(2)
-                        ],
-                        outside_duration=60,
-                        weight=1
-                    ),
-                    Route(
-                        stops=[
-                            Stop(place=home, duration=10),
-                            Stop(place=university, duration=40),
-                            Stop(place=workplace, duration=40),
-                            Stop(place=home, duration=10)
-                        ],
-                        weight=3
-                    ),
-                    Route(
-                        stops=[
-                            Stop(place=home, duration=10),
-                            Stop(place=university, duration=30),
-                            Stop(place=workplace, duration=30),
-                            Stop(place=public_regular, duration=20),
-                            Stop(place=home, duration=10)
-                        ],
-                        weight=2
-                    )
-                ]
+    def create_home_to_public_templates(
+            home: int, public_places: List[int], weight: float, outside_duration: int = 60) -> List['RouteTemplate']:
+        return [
+            RouteTemplate.create_home_to_outside_template(
+                home=home,
+                outside=public,
+                weight=weight / len(public_places),
+                outside_duration=outside_duration
             )
+            for public in public_places
+        ]
+
+
+class RouteArchetype:
+    __slots__ = ("name", "slots", "templates", "cum_weights", "_prob", "_alias")
+
+    def __init__(self, name: str, slots: List[str], templates: List[RouteTemplate]):
+        # Slots: the place type (factory name) filling each place of the templates.
+        self.name = name
+        self.slots = slots
+        self.templates = templates
+        weights = [template.weight for template in templates]
+        self.cum_weights = tuple(itertools.accumulate(weights))
+        # Alias table (Vose) for constant-time weighted draws.
+        n = len(weights)
+        self._prob = [weight * n / self.cum_weights[-1] for weight in weights]
+        self._alias = list(range(n))
+        small = [i for i, prob in enumerate(self._prob) if prob < 1]
+        large = [i for i, prob in enumerate(self._prob) if prob >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._alias[less] = more
+            self._prob[more] += self._prob[less] - 1
+            (small if self._prob[more] < 1 else large).append(more)
+        for i in small + large:
+            self._prob[i] = 1
+
+    def __repr__(self):
+        return f"RouteArchetype(name={self.name}, slots={len(self.slots)}, templates={len(self.templates)})"
+
+    def random_index(self, rng: random.Random = random) -> int:
+        u = rng.random() * len(self.templates)
+        index = int(u)
+        return index if u - index < self._prob[index] else self._alias[index]
+
+    def create_routes(self, rng: random.Random = random, config: Optional[SimulationConfig] = None) -> 'Routes':
+        factories = (config or SimulationConfig.default()).place_factory_list(self.slots)
+        return Routes(archetype=self, places=tuple(factory.get_random_place(rng) for factory in factories))
+
+
+class Routes:
+    __slots__ = ("archetype", "places")
+
+    def __init__(self, archetype: RouteArchetype, places: Tuple[Place, ...]):
+        self.archetype = archetype
+        self.places = places
+
+    def __repr__(self):
+        return f"Routes(archetype={self.archetype.name}, routes={len(self.archetype.templates)})"
+
+    @property
+    def routes(self) -> List[Route]:
+        return [template.bind(self.places) for template in self.archetype.templates]
+
+    def get_route(self, index: int) -> Route:
+        return self.archetype.templates[index].bind(self.places)
+
+    def boundaries(self, index: int):
+        return self.archetype.templates[index].boundaries(self.places)
+
+    def get_place(self, index: int, t: int):
+        return self.archetype.templates[index].get_place(self.places, t)
+
+    def random_index(self, rng: random.Random = random) -> int:
+        return self.archetype.random_index(rng)
+
+    def random_choices(self, k=1, rng: random.Random = random):
+        return [self.get_route(self.random_index(rng)) for _ in range(k)]
 
     @staticmethod
-    def get_routes_stay_home():
-        home = PLACE_FACTORY_HOME.get_random_place()
-        return Routes(
-                routes=[
-                    Route.create_home_route(
-                        home=home,
-                        weight=3
-                    ),
-                    *Route.create_home_to_public_routes(
-                        home=home,
-                        public_places=[
-                            PLACE_FACTORY_PUBLIC.get_random_place()
-                            for _ in range(3)
-                        ],
-                        outside_duration=60,
-                        weight=4
-                    )
-                ]
-            )
+    def get_routes_student(rng: random.Random = random, config: Optional[SimulationConfig] = None):
+        return ROUTE_ARCHETYPE_STUDENT.create_routes(rng, config=config)
+
+    @staticmethod
+    def get_routes_worker(rng: random.Random = random, config: Optional[SimulationConfig] = None):
+        return ROUTE_ARCHETYPE_WORKER.create_routes(rng, config=config)
+
+    @staticmethod
+    def get_routes_worker_student(rng: random.Random = random, config: Optional[SimulationConfig] = None):
+        return ROUTE_ARCHETYPE_WORKER_STUDENT.create_routes(rng, config=config)
+
+    @staticmethod
+    def get_routes_stay_home(rng: random.Random = random, config: Optional[SimulationConfig] = None):
+        return ROUTE_ARCHETYPE_STAY_HOME.create_routes(rng, config=config)
+
+
+# Slots: home, university, regular public place and 2 other public places.
+ROUTE_ARCHETYPE_STUDENT = RouteArchetype(
+    name="student",
+    slots=[
+        HOME,
+        UNIVERSITY,
+        PUBLIC,
+        PUBLIC,
+        PUBLIC
+    ],
+    templates=[
+        RouteTemplate.create_home_template(home=0, weight=1),
+        RouteTemplate.create_home_to_outside_template(home=0, outside=1, outside_duration=60, weight=3),
+        *RouteTemplate.create_home_to_public_templates(home=0, public_places=[2, 3, 4], outside_duration=60, weight=2),
+        RouteTemplate(stops=[(0, 20), (1, 30), (2, 30), (0, 20)], weight=1)
+    ]
+)
+
+# Slots: home, workplace, regular public place and 2 other public places.
+ROUTE_ARCHETYPE_WORKER = RouteArchetype(
+    name="worker",
+    slots=[
+        HOME,
+        WORKPLACE,
+        PUBLIC,
+        PUBLIC,
+        PUBLIC
+    ],
+    templates=[
+        RouteTemplate.create_home_template(home=0, weight=1),
+        RouteTemplate.create_home_to_outside_template(home=0, outside=1, outside_duration=60, weight=3),
+        *RouteTemplate.create_home_to_public_templates(home=0, public_places=[2, 3, 4], outside_duration=60, weight=1),
+        RouteTemplate(stops=[(0, 20), (1, 30), (2, 30), (0, 20)], weight=2)
+    ]
+)
+
+# Slots: home, workplace, university, regular public place and 2 other public places.
+ROUTE_ARCHETYPE_WORKER_STUDENT = RouteArchetype(
+    name="worker-student",
+    slots=[
+        HOME,
+        WORKPLACE,
+        UNIVERSITY,
+        PUBLIC,
+        PUBLIC,
+        PUBLIC
+    ],
+    templates=[
+        RouteTemplate.create_home_template(home=0, weight=1),
+        *RouteTemplate.create_home_to_public_templates(home=0, public_places=[3, 4, 5], outside_duration=60, weight=1),
+        RouteTemplate(stops=[(0, 10), (2, 40), (1, 40), (0, 10)], weight=3),
+        RouteTemplate(stops=[(0, 10), (2, 30), (1, 30), (3, 20), (0, 10)], weight=2)
+    ]
+)
+
+# Slots: home and 3 public places.
+ROUTE_ARCHETYPE_STAY_HOME = RouteArchetype(
+    name="stay-home",
+    slots=[HOME, PUBLIC, PUBLIC, PUBLIC],
+    templates=[
+        RouteTemplate.create_home_template(home=0, weight=3),
+        *RouteTemplate.create_home_to_public_templates(home=0, public_places=[1, 2, 3], outside_duration=60, weight=4)
+    ]
+)
+
+ROUTE_ARCHETYPES = {
+    archetype.name: archetype
+    for archetype in [
+        ROUTE_ARCHETYPE_STUDENT,
+        ROUTE_ARCHETYPE_WORKER,
+        ROUTE_ARCHETYPE_WORKER_STUDENT,
+        ROUTE_ARCHETYPE_STAY_HOME
+    ]
+}
@@ -0,0 +1,133 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from models.place import PlaceFactory, PlaceTable
+from models.population import Population
+from settings import *
+
+
+class RawResults:
+
+    def __init__(self, days: int, place_keys: Optional[Sequence[str]] = None):
+        self.days = days
+        self.place_keys = place_keys
+        self.confirmed: List[dict] = []
+        self.interactions: List[dict] = []
+
+    def __repr__(self):
+        return f"RawResults(confirmed={len(self.confirmed)}, interactions={len(self.interactions)})"
+
+    def add_confirmed(self, t: int, infected_cases: int, until: Optional[int] = None):
+        self.confirmed.extend(
+            {
+                "time": time,
+                "infected_cases": int(infected_cases)
+            }
+            for time in range(t, until if until is not None else t + 1)
+        )
+
+    def add_interactions(self, t: int, places: Sequence, groups: Sequence[int], totals: Sequence[int],
+                         risky: Sequence[int], infected: Sequence[int]):
+        for place, group, total, risky_total, infected_total in zip(places, groups, totals, risky, infected):
+            self.interactions.append({
+                "time": t,
+                "place": self.place_keys[place] if self.place_keys is not None else place,
+                "group": int(group),
+                "interactions_total": int(total),
+                "interactions_risky": int(risky_total),
+                "infected": int(infected_total)
+            })
+
+    def stop(self, t: int):
+        # Rows are only written for the ticks simulated: they end on the run's stopped_at.
+        pass
+
+    def results(self):
+        return self.confirmed, self.interactions
+
+
+class PlaceTypes:
+    # Index (on NAMES) of the type of each place, given by id on a PlaceTable / list of keys, or by key.
+    NAMES = [
+        PlaceFactory.CHOICE.TAG_HOME,
+        PlaceFactory.CHOICE.TAG_WORKPLACE,
+        PlaceFactory.CHOICE.TAG_UNIVERSITY,
+        PlaceFactory.CHOICE.TAG_PUBLIC
+    ]
+
+    def __init__(self, place_keys: Optional[Sequence[str]] = None):
+        self._index = {name: i for i, name in enumerate(self.NAMES)}
+        if isinstance(place_keys, PlaceTable):
+            place_type_ids = np.array([self._index[name] for name in place_keys.names], dtype=np.int64)
+            self._place_types = place_type_ids[place_keys.factory_ids]
+        else:
+            self._place_types = np.array([self._place_type(key) for key in place_keys], dtype=np.int64) \
+                if place_keys is not None else None
+        self._cache = {}
+
+    def __repr__(self):
+        return f"PlaceTypes(places={len(self._place_types) if self._place_types is not None else None})"
+
+    def _place_type(self, key: str):
+        return self._index[key.rsplit("-", 1)[0]]
+
+    def __call__(self, places: Sequence) -> np.ndarray:
+        if self._place_types is not None:
+            return self._place_types[places]
+        cache = self._cache
+        return np.fromiter(
+            (cache[place] if place in cache else cache.setdefault(place, self._place_type(place)) for place in places),
+            dtype=np.int64, count=len(places)
+        )
+
+
+class SummaryResults:
+    PLACE_TYPES = PlaceTypes.NAMES
+    COLUMNS = ["group", "interactions_total", "interactions_risky", "infected"]
+
+    def __init__(self, days: int, place_keys: Optional[Sequence[str]] = None):
+        self.days = days
+        self.infected_cases = np.zeros(days, dtype=np.int64)
+        # Daily sums per place type: (column, day, place type).
+        self.interactions = np.zeros((len(self.COLUMNS), days, len(self.PLACE_TYPES)), dtype=np.int64)
+        self._place_types = PlaceTypes(place_keys)
+
+    def __repr__(self):
+        return f"SummaryResults(days={self.days})"
+
+    def add_confirmed(self, t: int, infected_cases: int, until: Optional[int] = None):
+        # Daily maximum of every day the (filled) range goes through.
+        first = t // 100
+        last = (until - 1) // 100 if until is not None else first
+        self.infected_cases[first:last + 1] = np.maximum(self.infected_cases[first:last + 1], infected_cases)
+
+    def add_interactions(self, t: int, places: Sequence, groups: Sequence[int], totals: Sequence[int],
+                         risky: Sequence[int], infected: Sequence[int]):
+        place_types = self._place_types(places)
+        for i, values in enumerate([groups, totals, risky, infected]):
+            np.add.at(self.interactions[i, t // 100], place_types, np.asarray(values, dtype=np.int64))
+
+    def stop(self, t: int):
+        # Interactions of the days not simulated (from the one the stop tick leaves incomplete) are -1, not zeros.
+        first = t // 100 + 1 if t % 100 >= Population.INTERACTION_TICKS[-1] else t // 100
+        self.interactions[:, first:, :] = -1
+
+    def results(self):
+        days = np.arange(self.days)
+        confirmed = {
+            "time": days * 100 + 99,
+            "infected_cases": self.infected_cases
+        }
+        interactions = {
+            "time": np.repeat(days * 100, len(self.PLACE_TYPES)),
+            "place": np.tile(self.PLACE_TYPES, self.days),
+            **{column: self.interactions[i].ravel() for i, column in enumerate(self.COLUMNS)}
+        }
+        return confirmed, interactions
+
+
+RESULTS = {
+    SOCIAL_DISTANCING_TAG_OUTPUT_RAW: RawResults,
+    SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY: SummaryResults
+}
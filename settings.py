@@ -1,13 +1,11 @@
 import json
 import os
 
-with open("default.json", "r") as file:
-    SOCIAL_DISTANCING_DEFAULT_VALUES = json.loads(file.read())
-
-SOCIAL_DISTANCING_VAR_POPULATION = int(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_POPULATION",
-    default=SOCIAL_DISTANCING_DEFAULT_VALUES["population"]
-))
+# Scenario values (population, strategy & people distributions), read when a SimulationConfig is resolved.
+SOCIAL_DISTANCING_DEFAULT_VALUES_PATH = os.environ.get(
+    key="SOCIAL_DISTANCING_DEFAULT_VALUES_PATH",
+    default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "default.json")
+)
 
 SOCIAL_DISTANCING_TAG_STRATEGY_INTERACTING = "social-interacting"
 SOCIAL_DISTANCING_TAG_STRATEGY_DISTANCING = "social-distancing"
@@ -18,81 +16,94 @@ SOCIAL_DISTANCING_VAR_STRATEGIES = [
     SOCIAL_DISTANCING_TAG_STRATEGY_DISTANCING
 ]
 
-SOCIAL_DISTANCING_VAR_STRATEGY = os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_STRATEGY",
-    default=SOCIAL_DISTANCING_DEFAULT_VALUES["strategy"]
-)
+SOCIAL_DISTANCING_TAG_ENGINE_PYTHON = "python"
+SOCIAL_DISTANCING_TAG_ENGINE_NUMPY = "numpy"
 
-if SOCIAL_DISTANCING_VAR_STRATEGY not in SOCIAL_DISTANCING_VAR_STRATEGIES:
-    raise ValueError(f"Undefined strategy: {SOCIAL_DISTANCING_VAR_STRATEGY}")
+SOCIAL_DISTANCING_VAR_ENGINES = [
+    SOCIAL_DISTANCING_TAG_ENGINE_PYTHON,
+    SOCIAL_DISTANCING_TAG_ENGINE_NUMPY
+]
 
-SOCIAL_DISTANCING_DEFAULT_STRATEGY_VALUES = SOCIAL_DISTANCING_DEFAULT_VALUES.get("scenarios", {}).get(
-    SOCIAL_DISTANCING_VAR_STRATEGY,
-    {}
+SOCIAL_DISTANCING_VAR_ENGINE = os.environ.get(
+    key="SOCIAL_DISTANCING_VAR_ENGINE",
+    default=SOCIAL_DISTANCING_TAG_ENGINE_PYTHON
 )
 
-SOCIAL_DISTANCING_DEFAULT_PEOPLE_DISTRIBUTION_VALUES = SOCIAL_DISTANCING_DEFAULT_STRATEGY_VALUES.get(
-    "people-distribution",
-    {}
+if SOCIAL_DISTANCING_VAR_ENGINE not in SOCIAL_DISTANCING_VAR_ENGINES:
+    raise ValueError(f"Undefined engine: {SOCIAL_DISTANCING_VAR_ENGINE}")
+
+SOCIAL_DISTANCING_TAG_BACKEND_THREAD = "thread"
+SOCIAL_DISTANCING_TAG_BACKEND_PROCESS = "process"
+
+SOCIAL_DISTANCING_VAR_BACKENDS = [
+    SOCIAL_DISTANCING_TAG_BACKEND_THREAD,
+    SOCIAL_DISTANCING_TAG_BACKEND_PROCESS
+]
+
+SOCIAL_DISTANCING_VAR_BACKEND = os.environ.get(
+    key="SOCIAL_DISTANCING_VAR_BACKEND",
+    default=SOCIAL_DISTANCING_TAG_BACKEND_PROCESS
 )
 
-# STUDENTS
-SOCIAL_DISTANCING_VAR_PERCENT_STUDENTS = int(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_PERCENT_STUDENTS",
-    default=SOCIAL_DISTANCING_DEFAULT_PEOPLE_DISTRIBUTION_VALUES["students"]
-))
+SOCIAL_DISTANCING_TAG_OUTPUT_RAW = "raw"
+SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY = "summary"
 
-SOCIAL_DISTANCING_VAR_STUDENTS = round(SOCIAL_DISTANCING_VAR_PERCENT_STUDENTS * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+SOCIAL_DISTANCING_VAR_OUTPUTS = [
+    SOCIAL_DISTANCING_TAG_OUTPUT_RAW,
+    SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY
+]
 
-# WORKERS
-SOCIAL_DISTANCING_VAR_PERCENT_WORKERS = int(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_PERCENT_WORKERS",
-    default=SOCIAL_DISTANCING_DEFAULT_PEOPLE_DISTRIBUTION_VALUES["workers"]
-))
+SOCIAL_DISTANCING_VAR_OUTPUT = os.environ.get(
+    key="SOCIAL_DISTANCING_VAR_OUTPUT",
+    default=SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY
+)
 
-SOCIAL_DISTANCING_VAR_WORKERS = round(SOCIAL_DISTANCING_VAR_PERCENT_WORKERS * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+if SOCIAL_DISTANCING_VAR_OUTPUT not in SOCIAL_DISTANCING_VAR_OUTPUTS:
+    raise ValueError(f"Undefined output: {SOCIAL_DISTANCING_VAR_OUTPUT}")
 
-# WORKER STUDENTS
-SOCIAL_DISTANCING_VAR_PERCENT_WORKER_STUDENTS = int(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_PERCENT_WORKER_STUDENTS",
-    default=SOCIAL_DISTANCING_DEFAULT_PEOPLE_DISTRIBUTION_VALUES["worker-students"]
-))
+SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_CSV = "csv"
+SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_NPZ = "npz"
+SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_PARQUET = "parquet"
 
-SOCIAL_DISTANCING_VAR_WORKER_STUDENTS = round(
-    SOCIAL_DISTANCING_VAR_PERCENT_WORKER_STUDENTS * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+SOCIAL_DISTANCING_VAR_OUTPUT_FORMATS = [
+    SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_CSV,
+    SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_NPZ,
+    SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_PARQUET
+]
 
-# STAY HOME
-SOCIAL_DISTANCING_VAR_PERCENT_STAY_HOME = int(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_PERCENT_STAY_HOME",
-    default=SOCIAL_DISTANCING_DEFAULT_PEOPLE_DISTRIBUTION_VALUES["stay-home"]
-))
+SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT = os.environ.get(
+    key="SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT",
+    default=SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_CSV
+)
 
-SOCIAL_DISTANCING_VAR_STAY_HOME = \
-    round(SOCIAL_DISTANCING_VAR_PERCENT_STAY_HOME * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+if SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT not in SOCIAL_DISTANCING_VAR_OUTPUT_FORMATS:
+    raise ValueError(f"Undefined output format: {SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT}")
 
-# NUM HOMES
-SOCIAL_DISTANCING_VAR_FACTORY_NUM_HOMES = round(float(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_FACTORY_NUM_HOMES",
-    default="20"
-)) * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+SOCIAL_DISTANCING_VAR_CACHE_PATH = os.environ.get(
+    key="SOCIAL_DISTANCING_VAR_CACHE_PATH",
+    default=os.path.join(os.path.expanduser("~"), ".cache", "social-distancing")
+)
 
-# NUM WORKPLACE
-SOCIAL_DISTANCING_VAR_FACTORY_NUM_WORKPLACE = round(float(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_FACTORY_NUM_WORKPLACE",
-    default="10"
-)) * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+# Size in MB
+SOCIAL_DISTANCING_VAR_CACHE_MAX_SIZE = float(os.environ.get(
+    key="SOCIAL_DISTANCING_VAR_CACHE_MAX_SIZE",
+    default="1024"
+))
 
-# NUM UNIVERSITY
-SOCIAL_DISTANCING_VAR_FACTORY_NUM_UNIVERSITY = round(float(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_FACTORY_NUM_UNIVERSITY",
-    default="1"
-)) * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+# Variables that don't change the outcome of a simulation (excluded from the result cache key).
+SOCIAL_DISTANCING_RUNTIME_VARS = [
+    "SOCIAL_DISTANCING_VAR_ENGINE",
+    "SOCIAL_DISTANCING_VAR_BACKEND",
+    "SOCIAL_DISTANCING_VAR_OUTPUT",
+    "SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT",
+    "SOCIAL_DISTANCING_VAR_CACHE_PATH",
+    "SOCIAL_DISTANCING_VAR_CACHE_MAX_SIZE",
+    "SOCIAL_DISTANCING_DEFAULT_VALUES_PATH",
+    "SOCIAL_DISTANCING_RUNTIME_VARS"
+]
 
-# NUM PUBLIC
-SOCIAL_DISTANCING_VAR_FACTORY_NUM_PUBLIC = round(float(os.environ.get(
-    key="SOCIAL_DISTANCING_VAR_FACTORY_NUM_PUBLIC",
-    default="15"
-)) * SOCIAL_DISTANCING_VAR_POPULATION / 100)
+# Parameters that tell apart the runs of a same scenario (excluded from its config id).
+RUN_PARAMETERS = ["seed", "world", "pair"]
 
 
 def get_global_environment_vars(prefix="SOCIAL_DISTANCING"):
@@ -101,3 +112,25 @@ def get_global_environment_vars(prefix="SOCIAL_DISTANCING"):
         for k, v in globals().items()
         if k.startswith(prefix)
     }
+
+
+def get_default_values(path: str = SOCIAL_DISTANCING_DEFAULT_VALUES_PATH):
+    with open(path, "r") as file:
+        return json.loads(file.read())
+
+
+def get_simulation_config(config, **parameters):
+    return {
+        **{
+            k: v
+            for k, v in get_global_environment_vars().items()
+            if k not in SOCIAL_DISTANCING_RUNTIME_VARS
+        },
+        **config.to_dict(),
+        **parameters
+    }
+
+
+def get_scenario_config(config, **parameters):
+    # Simulation config without the per-run parameters: every replicate of a scenario shares its hash (config id).
+    return get_simulation_config(config, **{k: v for k, v in parameters.items() if k not in RUN_PARAMETERS})
@@ -0,0 +1,223 @@
+import functools
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _coverage(x: float, df: Optional[int] = None) -> float:
+    # P(|X| < x) of the standard normal or, given its degrees of freedom, of Student's t (Abramowitz & Stegun 26.7.3-4:
+    # exact sums for integer degrees of freedom).
+    if df is None:
+        return math.erf(x / math.sqrt(2))
+    theta = math.atan(x / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    term, total = 1.0, 1.0
+    for k in range(2 if df % 2 else 1, df - 1, 2):
+        term *= k / (k + 1) * cos2
+        total += term
+    if df % 2:
+        return 2 / math.pi * (theta + (math.sin(theta) * math.cos(theta) * total if df > 1 else 0))
+    return math.sin(theta) * total
+
+
+@functools.lru_cache(maxsize=None)
+def critical_value(confidence: float, df: Optional[int] = None) -> float:
+    # Two-sided critical value, P(|X| < x) = confidence, of the standard normal or of Student's t with "df" degrees
+    # of freedom, by bisection (statistics.NormalDist needs Python 3.8). Over 100 degrees of freedom the t value comes
+    # from the normal one (Cornish-Fisher expansion, exact to 1e-6), the sums above grow with them.
+    if df is not None and df > 100:
+        z = critical_value(confidence)
+        return z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2) + \
+            (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    low, high = 0.0, 1.0
+    while _coverage(high, df) < confidence:
+        low, high = high, high * 2
+    for _ in range(64):
+        middle = (low + high) / 2
+        low, high = (middle, high) if _coverage(middle, df) < confidence else (low, middle)
+    return (low + high) / 2
+
+
+class RunningStats:
+    # Element-wise count, mean & variance (Welford) of many series, plus an optional histogram quantile sketch.
+
+    def __init__(self, quantile_bins: int = 0, upper: Optional[float] = None):
+        self.quantile_bins = quantile_bins
+        # Quantile sketch range [0, upper]: starts with bins of width 1 and doubles whenever a value goes over it.
+        self.upper = upper if upper is not None else max(quantile_bins, 1)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0, dtype=np.float64)
+        self.m2 = np.zeros(0, dtype=np.float64)
+        self.histogram = np.zeros((0, quantile_bins), dtype=np.int64)
+
+    def __repr__(self):
+        return f"RunningStats(size={self.size}, runs={self.count.max() if self.size else 0})"
+
+    @property
+    def size(self):
+        return len(self.count)
+
+    def _resize(self, size: int):
+        if size <= self.size:
+            return
+        extra = size - self.size
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros(extra)])
+        self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+        self.histogram = np.concatenate([self.histogram, np.zeros((extra, self.quantile_bins), dtype=np.int64)])
+
+    @staticmethod
+    def _halve(histogram: np.ndarray) -> np.ndarray:
+        # Histogram of a range twice as wide: every pair of bins goes into one, the top half is empty.
+        size, bins = histogram.shape
+        merged = np.concatenate([histogram, np.zeros((size, bins % 2), dtype=np.int64)], axis=1)
+        merged = merged.reshape(size, -1, 2).sum(axis=2)
+        return np.concatenate([merged, np.zeros((size, bins - merged.shape[1]), dtype=np.int64)], axis=1)
+
+    def _grow(self, upper: float):
+        while self.upper < upper:
+            self.histogram = self._halve(self.histogram)
+            self.upper *= 2
+
+    def _bins(self, values: np.ndarray):
+        # Only the top of the range (value == upper) shares the last bin.
+        return np.minimum((values / self.upper * self.quantile_bins).astype(np.int64), self.quantile_bins - 1)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        self._resize(len(values))
+        index = np.arange(len(values))
+        self.count[index] += 1
+        delta = values - self.mean[index]
+        self.mean[index] += delta / self.count[index]
+        self.m2[index] += delta * (values - self.mean[index])
+        if self.quantile_bins:
+            if (values < 0).any():
+                raise ValueError("Quantiles are only estimated for non-negative values")
+            self._grow(values.max(initial=0))
+            self.histogram[index, self._bins(values)] += 1
+        return self
+
+    def merge(self, other: 'RunningStats'):
+        # Chan et al. parallel combination of two partial aggregates.
+        size = max(self.size, other.size)
+        self._resize(size)
+        count, mean, m2 = (np.zeros(size, dtype=np.int64), np.zeros(size), np.zeros(size))
+        count[:other.size], mean[:other.size], m2[:other.size] = other.count, other.mean, other.m2
+        total = self.count + count
+        delta = mean - self.mean
+        weight = np.divide(count, total, out=np.zeros(size), where=total > 0)
+        self.m2 += m2 + delta ** 2 * self.count * weight
+        self.mean += delta * weight
+        self.count = total
+        if self.quantile_bins:
+            self._grow(other.upper)
+            histogram, upper = other.histogram, other.upper
+            while upper < self.upper:
+                histogram, upper = self._halve(histogram), upper * 2
+            if upper != self.upper:
+                raise ValueError(f"Quantile sketches of different ranges: {self.upper}, {other.upper}")
+            self.histogram[:other.size] += histogram
+        return self
+
+    @property
+    def variance(self):
+        return np.divide(self.m2, self.count - 1, out=np.full(self.size, np.nan), where=self.count > 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def half_width(self, confidence: float = 0.95):
+        # Half width of the Student's t confidence interval of the mean: a few runs get a much wider interval than the
+        # normal one (12.7 against 1.96 standard errors with 2 runs, at 95%).
+        counts, index = np.unique(self.count, return_inverse=True)
+        critical = np.array([critical_value(confidence, int(count) - 1) if count > 1 else np.nan for count in counts])
+        return critical[index] * self.std / np.sqrt(np.maximum(self.count, 1))
+
+    def quantile(self, q: float):
+        if not self.quantile_bins:
+            raise ValueError("Quantiles require a RunningStats created with quantile_bins > 0")
+        cumulative = np.cumsum(self.histogram, axis=1)
+        # Midpoint of the histogram bin holding the q-th observation of each element.
+        ranks = np.maximum(np.ceil(q * self.count), 1)[:, None]
+        bins = (cumulative < ranks).sum(axis=1)
+        return (bins + 0.5) * self.upper / self.quantile_bins
+
+
+class ConfirmedAggregator:
+
+    def __init__(self, quantile_bins: int = 0):
+        self.quantile_bins = quantile_bins
+        self.stats: Dict[str, RunningStats] = {}
+
+    def __repr__(self):
+        return f"ConfirmedAggregator(strategies={list(self.stats)})"
+
+    def _get(self, strategy: str):
+        if strategy not in self.stats:
+            self.stats[strategy] = RunningStats(quantile_bins=self.quantile_bins)
+        return self.stats[strategy]
+
+    def add(self, strategy: str, daily_infected_cases: np.ndarray):
+        self._get(strategy).update(daily_infected_cases)
+        return self
+
+    def merge(self, other: 'ConfirmedAggregator'):
+        for strategy, stats in other.stats.items():
+            self._get(strategy).merge(stats)
+        return self
+
+    def to_frame(self, quantiles: Optional[List[float]] = None) -> pd.DataFrame:
+        frames = []
+        for strategy, stats in self.stats.items():
+            frames.append(pd.DataFrame({
+                "day": np.arange(stats.size),
+                "strategy": strategy,
+                "runs": stats.count,
+                "infected_cases": stats.mean,
+                "std": stats.std,
+                **{f"q{q:g}": stats.quantile(q) for q in (quantiles or [])}
+            }))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["day", "strategy"])
+
+
+class ConvergenceCriterion:
+    # Streaming stopping rule: the confidence interval of a run statistic is narrower than "tolerance".
+    METRIC_MEAN = "mean"
+    METRIC_PEAK_DAY = "peak-day"
+    METRICS = [METRIC_MEAN, METRIC_PEAK_DAY]
+
+    def __init__(self, tolerance: float, metric: str = METRIC_MEAN, confidence: float = 0.95, min_runs: int = 3):
+        if metric not in self.METRICS:
+            raise ValueError(f"Undefined metric: {metric}")
+        self.tolerance = tolerance
+        self.metric = metric
+        self.confidence = confidence
+        self.min_runs = max(min_runs, 2)
+        self.stats = RunningStats()
+
+    def __repr__(self):
+        return f"ConvergenceCriterion(metric={self.metric}, runs={self.runs}, half_width={self.half_width:.4g})"
+
+    @property
+    def runs(self) -> int:
+        return int(self.stats.count.min()) if self.stats.size else 0
+
+    def update(self, daily_infected_cases: np.ndarray):
+        # "mean": every day of the mean infected curve must converge; "peak-day": the day with most infected cases.
+        if self.metric == self.METRIC_PEAK_DAY:
+            self.stats.update([np.argmax(daily_infected_cases)])
+        else:
+            self.stats.update(daily_infected_cases)
+        return self
+
+    @property
+    def half_width(self) -> float:
+        return float(np.max(self.stats.half_width(self.confidence))) if self.runs > 1 else np.inf
+
+    @property
+    def converged(self) -> bool:
+        return self.runs >= self.min_runs and self.half_width <= self.tolerance
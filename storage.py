@@ -0,0 +1,161 @@
+import importlib.util
+import os
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from settings import *
+
+# Raw results are records (one dict per row), summaries are already columnar.
+Records = Union[List[dict], Dict[str, np.ndarray]]
+
+CONFIRMED_DTYPES = {
+    "time": "int32",
+    "infected_cases": "int32",
+    "day": "int16"
+}
+
+INTERACTIONS_DTYPES = {
+    "time": "int32",
+    "place": "category",
+    "group": "int32",
+    "interactions_total": "int64",
+    "interactions_risky": "int64",
+    "infected": "int32",
+    "day": "int16"
+}
+
+
+def _to_frame(records: Records, dtypes: dict, run_id: Optional[str] = None) -> pd.DataFrame:
+    df = pd.DataFrame(records, columns=[column for column in dtypes if column != "day"])
+    df["day"] = df.time // 100
+    if run_id is not None:
+        df["run_id"] = run_id
+    return df.astype({**dtypes, **({"run_id": "category"} if run_id is not None else {})})
+
+
+def confirmed_frame(confirmed: Records, run_id: Optional[str] = None) -> pd.DataFrame:
+    return _to_frame(confirmed, dtypes=CONFIRMED_DTYPES, run_id=run_id)
+
+
+def interactions_frame(interactions: Records, run_id: Optional[str] = None) -> pd.DataFrame:
+    return _to_frame(interactions, dtypes=INTERACTIONS_DTYPES, run_id=run_id)
+
+
+class ResultFormat:
+    name = ""
+
+    def __repr__(self):
+        return f"ResultFormat(name={self.name})"
+
+    @property
+    def extension(self):
+        return f".{self.name}"
+
+    def write(self, df: pd.DataFrame, file_path: str):
+        raise NotImplementedError
+
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class CsvFormat(ResultFormat):
+    name = SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_CSV
+
+    def write(self, df: pd.DataFrame, file_path: str):
+        df.to_csv(file_path, index=False)
+
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.read_csv(
+            file_path,
+            usecols=(lambda column: column in columns) if columns is not None else None,
+            dtype={**CONFIRMED_DTYPES, **INTERACTIONS_DTYPES, "run_id": "category"}
+        )
+
+
+class NpzFormat(ResultFormat):
+    name = SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_NPZ
+
+    def write(self, df: pd.DataFrame, file_path: str):
+        arrays = {}
+        for column in df.columns:
+            values = df[column]
+            # Categorical columns are stored as integer codes plus their categories.
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                arrays[f"{column}.codes"] = values.cat.codes.values
+                arrays[f"{column}.categories"] = np.asarray(values.cat.categories, dtype=str)
+            else:
+                arrays[column] = values.values
+        with open(file_path, "wb") as file:
+            np.savez(file, **arrays)
+
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        data = {}
+        # Arrays are loaded lazily, so columns left out are never read from disk.
+        with np.load(file_path) as npz:
+            for name in npz.files:
+                column, _, part = name.partition(".")
+                if (columns is not None and column not in columns) or part == "categories":
+                    continue
+                data[column] = npz[name] if not part else \
+                    pd.Categorical.from_codes(npz[name], categories=npz[f"{column}.categories"])
+        return pd.DataFrame(data)
+
+
+class ParquetFormat(ResultFormat):
+    name = SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_PARQUET
+
+    def __init__(self):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("The parquet output format requires pyarrow: pip install pyarrow")
+
+    def write(self, df: pd.DataFrame, file_path: str):
+        df.to_parquet(file_path, index=False)
+
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        import pyarrow.parquet
+        if columns is not None:
+            names = pyarrow.parquet.read_schema(file_path).names
+            columns = [column for column in columns if column in names]
+        return pd.read_parquet(file_path, columns=columns)
+
+
+FORMATS = {
+    SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_CSV: CsvFormat,
+    SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_NPZ: NpzFormat,
+    SOCIAL_DISTANCING_TAG_OUTPUT_FORMAT_PARQUET: ParquetFormat
+}
+
+
+def _daily_maximum(run: pd.DataFrame) -> np.ndarray:
+    daily = run.groupby("day")["infected_cases"].max()
+    values = np.zeros(daily.index.max() + 1, dtype=np.int64)
+    values[daily.index.values] = daily.values
+    return values
+
+
+def daily_infected_cases(confirmed: Records) -> np.ndarray:
+    # Daily maximum of infected cases of a single run, straight from its results.
+    return _daily_maximum(confirmed_frame(confirmed))
+
+
+def read_daily_infected_cases(filename: str) -> List[np.ndarray]:
+    # Daily maximum of infected cases for every run stored on a confirmed results file, in run id order (some pandas
+    # versions group observed categories in order of appearance).
+    df = get_format_from_filename(filename).read(filename, columns=["run_id", "day", "infected_cases"])
+    runs = [
+        group for _, group in sorted(df.groupby("run_id", observed=True), key=lambda run: str(run[0]))
+    ] if "run_id" in df else [df]
+    return [_daily_maximum(run) for run in runs]
+
+
+def get_format(name: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT) -> ResultFormat:
+    if name not in FORMATS:
+        raise ValueError(f"Undefined output format: {name}")
+    return FORMATS[name]()
+
+
+def get_format_from_filename(filename: str) -> Optional[ResultFormat]:
+    _, extension = os.path.splitext(filename)
+    return get_format(extension[1:]) if extension[1:] in FORMATS else None
@@ -0,0 +1,193 @@
+import itertools
+import logging
+import multiprocessing
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import SimulationConfig
+from core import RunFailure, Simulator
+from settings import *
+from storage import get_format
+from utils import get_dict_hash_key
+from writer import ResultWriter
+
+logger = logging.getLogger(__name__)
+
+
+class Sweep:
+    # Every configuration of a grid (times its replicates) scheduled on a single worker pool.
+    RUN_KEYS = ["days", "risky_interactions", "replicates"]
+    COLUMNS = {
+        "strategy": "category",
+        "population": "int32",
+        "risky_interactions": "float64",
+        "days": "int16",
+        "replicate": "int16"
+    }
+
+    def __init__(self, configurations: List[dict], days: int = 100, risky_interactions: float = 0.05,
+                 replicates: int = 1, engine: str = SOCIAL_DISTANCING_VAR_ENGINE, event_driven: bool = True,
+                 output: str = SOCIAL_DISTANCING_VAR_OUTPUT, njobs: int = -1,
+                 backend: str = SOCIAL_DISTANCING_VAR_BACKEND, cache: bool = True,
+                 output_format: str = SOCIAL_DISTANCING_VAR_OUTPUT_FORMAT, early_stop: bool = True, retries: int = 2):
+        # Configurations: SimulationConfig keyword arguments, optionally overriding days, risky_interactions and
+        # replicates; anything not given comes from the environment.
+        if backend not in SOCIAL_DISTANCING_VAR_BACKENDS:
+            raise ValueError(f"Undefined backend: {backend}")
+        self.configurations = configurations
+        self.days = days
+        self.risky_interactions = risky_interactions
+        self.replicates = replicates
+        self.engine = engine
+        self.event_driven = event_driven
+        self.early_stop = early_stop
+        self.output = output
+        self.njobs = njobs if njobs > 0 else multiprocessing.cpu_count()
+        self.backend = backend
+        self.cache = cache
+        # Times the failed runs are run again (after the rest of the sweep) before they're given up.
+        self.retries = retries
+        self.result_format = get_format(output_format)
+
+    def __repr__(self):
+        return f"Sweep(configurations={len(self.configurations)}, replicates={self.replicates})"
+
+    @staticmethod
+    def grid(**axes) -> List[dict]:
+        # Cartesian product of the given values, e.g. grid(strategy=[...], population=[...]).
+        names = list(axes)
+        values = [value if isinstance(value, (list, tuple)) else [value] for value in axes.values()]
+        return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+    def _seed(self, seed: Optional[int], path: str) -> int:
+        # The master seed is kept with the sweep, so a resumed sweep draws the same runs.
+        manifest_path = os.path.join(path, "sweep.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as file:
+                manifest = json.loads(file.read())
+            if seed is not None and seed != manifest["seed"]:
+                raise ValueError(f"Sweep {path} was started with seed {manifest['seed']}, got {seed}")
+            seed = manifest["seed"]
+        seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2 ** 63)
+        os.makedirs(path, exist_ok=True)
+        with open(manifest_path, "w") as file:
+            file.write(json.dumps({"seed": seed, "configurations": self.configurations}))
+        return seed
+
+    def items(self, path: str, seed: int) -> List[Tuple[int, dict]]:
+        # (replicate, simulator item) of every run.
+        items = []
+        for configuration in self.configurations:
+            days = configuration.get("days", self.days)
+            risky_interactions = configuration.get("risky_interactions", self.risky_interactions)
+            config = SimulationConfig.from_environment(
+                **{k: v for k, v in configuration.items() if k not in self.RUN_KEYS})
+            for replicate in range(configuration.get("replicates", self.replicates)):
+                run_id = get_dict_hash_key(dictionary={
+                    **config.to_dict(),
+                    "engine": self.engine,
+                    "days": days,
+                    "risky_interactions": risky_interactions,
+                    "output": self.output,
+                    "early_stop": self.early_stop,
+                    "seed": seed,
+                    "replicate": replicate
+                })
+                # Each run seed only depends on the master seed and the run itself, not on its place on the grid.
+                run_seed = np.random.SeedSequence([seed, int(run_id[:16], 16)]).generate_state(1, np.uint64)[0]
+                items.append((replicate, {
+                    "id": run_id,
+                    "base_path": path,
+                    "engine": self.engine,
+                    "days": days,
+                    "risky_interactions": risky_interactions,
+                    "event_driven": self.event_driven,
+                    "seed": int(run_seed),
+                    "output": self.output,
+                    "world": None,
+                    "early_stop": self.early_stop,
+                    "config": config,
+                    "cache": self.cache
+                }))
+        # Biggest runs first, so the pool isn't left waiting on a large run scheduled last.
+        return sorted(items, key=lambda run: run[1]["config"].population * run[1]["days"], reverse=True)
+
+    @staticmethod
+    def completed(path: str) -> Dict[str, str]:
+        # Run id -> directory of the runs that are completed, i.e. whose config file (written last) exists.
+        runs_path = os.path.join(path, "runs")
+        if not os.path.isdir(runs_path):
+            return {}
+        return {
+            filename[:-len("-config.json")]: os.path.join(runs_path, strategy)
+            for strategy in os.listdir(runs_path)
+            for filename in os.listdir(os.path.join(runs_path, strategy))
+            if filename.endswith("-config.json")
+        }
+
+    def _save_run(self, path: str, replicate: int, result: tuple):
+        # A single run on "{path}/runs/{strategy}/{run_id}-*": its config file (written last) marks it completed.
+        worker_id, base_path, run_id, config, parameters, metadata, confirmed, interactions = result
+        Simulator.save(worker_id, self.result_format.name,
+                       [(base_path, run_id, config, parameters, {**metadata, "replicate": replicate}, confirmed,
+                         interactions)],
+                       path=os.path.join(path, "runs", config.strategy), prefix=run_id)
+
+    def consolidate(self, path: str):
+        # Every run of the sweep in a single dataset per kind of result, with the run parameters as columns.
+        extension = self.result_format.extension
+        completed = self.completed(path)
+        for kind in ["confirmed", "interactions"]:
+            frames = []
+            for run_id, file_path in sorted(completed.items()):
+                with open(os.path.join(file_path, f"{run_id}-config.json"), "r") as file:
+                    run_config = json.loads(file.read())
+                df = self.result_format.read(os.path.join(file_path, f"{run_id}-{kind}{extension}"))
+                frames.append(df.assign(
+                    run_id=run_id,
+                    strategy=run_config["SOCIAL_DISTANCING_VAR_STRATEGY"],
+                    population=run_config["SOCIAL_DISTANCING_VAR_POPULATION"],
+                    risky_interactions=run_config["risky_interactions"],
+                    days=run_config["days"],
+                    replicate=run_config["replicate"]
+                ))
+            if not frames:
+                continue
+            df = pd.concat(frames, ignore_index=True).astype({**self.COLUMNS, "run_id": "category"})
+            if "place" in df:
+                df["place"] = df["place"].astype("category")
+            self.result_format.write(df, os.path.join(path, f"sweep-{kind}{extension}"))
+
+    def run(self, path: str, seed: Optional[int] = None) -> dict:
+        seed = self._seed(seed, path)
+        items = self.items(path, seed)
+        completed = self.completed(path)
+        pending = [item for _, item in items if item["id"] not in completed]
+        logger.info(f"Sweep {path}: {len(pending)} runs pending, {len(items) - len(pending)} already completed")
+        replicates = {item["id"]: replicate for replicate, item in items}
+        simulated, retried = len(pending), 0
+        # Runs are written one by one (their config file marks them completed) by a background writer.
+        writer = ResultWriter(save=lambda replicate, runs: self._save_run(path, replicate, *runs),
+                              max_pending=2 * self.njobs, threads=self.njobs)
+        with writer:
+            for attempt in range(self.retries + 1):
+                failures = []
+                for result in Simulator.dispatch(pending, backend=self.backend, njobs=self.njobs):
+                    if isinstance(result, RunFailure):
+                        failures.append(result)
+                    else:
+                        writer.put(replicates[result[2]], result)
+                pending = [failure.item for failure in failures]
+                if not pending or attempt == self.retries:
+                    break
+                logger.warning(f"Sweep {path}: retrying {len(pending)} failed runs")
+                retried += len(pending)
+        # Failed runs aren't completed: running the sweep again retries them.
+        for failure in failures:
+            logger.error(f"Sweep {path}: run {failure.item['id']} failed: {failure.error}")
+        self.consolidate(path)
+        return {"runs": len(items), "simulated": simulated, "skipped": len(items) - simulated, "failed": len(failures),
+                "retried": retried, "seed": seed}
@@ -0,0 +1,31 @@
+import core
+from cache import ResultCache
+from catalog import ResultCatalog
+from config import SimulationConfig
+from core import Simulator
+from settings import *
+
+
+def _cache(path: str):
+    class TemporaryCache(ResultCache):
+        def __init__(self):
+            super().__init__(path=path)
+    return TemporaryCache
+
+
+def _run(path: str, seed):
+    config = SimulationConfig.from_environment(population=200)
+    Simulator(simulations=2, njobs=1, backend=SOCIAL_DISTANCING_TAG_BACKEND_THREAD, config=config).run(
+        days=3, output_path=path, seed=seed)
+    return {run["seed"]: run["final_infected_cases"] for run in ResultCatalog(path).runs()}
+
+
+def test_only_seeded_runs_are_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "ResultCache", _cache(str(tmp_path / "cache")))
+    _run(str(tmp_path / "random"), seed=None)
+    assert not ResultCache(path=str(tmp_path / "cache")).entries()
+    first = _run(str(tmp_path / "first"), seed=3)
+    assert len(ResultCache(path=str(tmp_path / "cache")).entries()) == 2
+    # Cached runs don't build their simulation.
+    monkeypatch.setattr(core.Simulation, "from_engine", None)
+    assert _run(str(tmp_path / "second"), seed=3) == first
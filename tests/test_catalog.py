@@ -0,0 +1,25 @@
+from catalog import ResultCatalog
+from config import SimulationConfig
+from core import Simulator
+from settings import *
+
+
+def test_replicates_share_their_config_id(tmp_path):
+    config = SimulationConfig.from_environment(population=200)
+    Simulator(simulations=3, njobs=1, backend=SOCIAL_DISTANCING_TAG_BACKEND_THREAD, cache=False,
+              config=config).run(days=3, output_path=str(tmp_path), seed=11)
+    runs = ResultCatalog(str(tmp_path)).runs()
+    assert len(runs) == 3
+    assert len({run["config_id"] for run in runs}) == 1
+    assert len({run["seed"] for run in runs}) == 3
+
+
+def test_rebuild_finds_the_runs_of_batch_files(tmp_path):
+    config = SimulationConfig.from_environment(population=200)
+    Simulator(simulations=4, njobs=2, backend=SOCIAL_DISTANCING_TAG_BACKEND_THREAD, cache=False, batch_size=3,
+              config=config, output_format="csv").run(days=5, risky_interactions=0.1, output_path=str(tmp_path), seed=9)
+    catalog = ResultCatalog(str(tmp_path))
+    columns = ["run_id", "seed", "confirmed_path", "peak_infected_cases", "peak_day", "final_infected_cases"]
+    runs = [{column: run[column] for column in columns} for run in catalog.runs()]
+    assert catalog.rebuild() == 4
+    assert [{column: run[column] for column in columns} for run in catalog.runs()] == runs
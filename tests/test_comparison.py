@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from catalog import ResultCatalog
+from comparison import Comparison
+from config import SimulationConfig
+from core import Simulation
+from models.population import Population
+from settings import *
+
+
+def _paired(engine: str, days: int = 5, seed: int = 7):
+    configs = [SimulationConfig.from_environment(strategy=strategy, population=500)
+               for strategy in [SOCIAL_DISTANCING_TAG_STRATEGY_INTERACTING, SOCIAL_DISTANCING_TAG_STRATEGY_DISTANCING]]
+    populations = Population.create_paired(rng=np.random.default_rng(seed), configs=configs)
+    simulations = [
+        Simulation.from_engine(engine=engine, days=days, seed=seed, population=population, history_days=-1,
+                               early_stop=False)
+        for population in populations
+    ]
+    for simulation in simulations:
+        simulation.run()
+    return populations, simulations
+
+
+def _by_person(population: Population, values: np.ndarray) -> dict:
+    return dict(zip(population.person_ids.tolist(), values))
+
+
+@pytest.mark.parametrize("engine", SOCIAL_DISTANCING_VAR_ENGINES)
+def test_paired_runs_follow_the_same_routes(engine):
+    populations, simulations = _paired(engine)
+    groups = [_by_person(population, np.repeat(np.arange(len(population.groups)),
+                                               [size for _, size, _ in population.groups]))
+              for population in populations]
+    routes = [_by_person(population, simulation.route_history.T)
+              for population, simulation in zip(populations, simulations)]
+    same_group = [person for person in groups[0] if groups[0][person] == groups[1].get(person)]
+    assert len(same_group) > len(populations[0]) // 2
+    for person in same_group:
+        np.testing.assert_array_equal(routes[0][person], routes[1][person])
+
+
+def test_paired_populations_share_the_world():
+    configs = [SimulationConfig.from_environment(strategy=strategy, population=500)
+               for strategy in SOCIAL_DISTANCING_VAR_STRATEGIES]
+    populations = Population.create_paired(rng=np.random.default_rng(0), configs=configs)
+    homes = [_by_person(population, population.places[:, 0]) for population in populations]
+    for population, config in zip(populations, configs):
+        assert population.groups == Population.default_groups(config)
+    # Every person keeps their home on every scenario.
+    assert homes[0] == {person: homes[1][person] for person in homes[0]}
+
+
+@pytest.mark.parametrize("backend", SOCIAL_DISTANCING_VAR_BACKENDS)
+def test_comparison_saves_every_pair(tmp_path, backend):
+    path = str(tmp_path / "comparison")
+    comparison = Comparison(replicates=2, days=3, njobs=2, backend=backend, output_format="csv", population=200)
+    summary = comparison.run(path, seed=1)
+    assert summary["failed"] == 0
+    assert set(summary["differences"]) == set(comparison.strategies[1:])
+    runs = ResultCatalog(path).runs()
+    assert len(runs) == 2 * len(comparison.strategies)
+    assert all(os.path.exists(os.path.join(path, run["confirmed_path"])) for run in runs)
+    assert os.path.exists(os.path.join(path, "comparison.json"))
+    # A second comparison on the same directory would replace the catalog rows of the first one.
+    with pytest.raises(ValueError):
+        comparison.run(path, seed=2)
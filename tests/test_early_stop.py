@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import SimulationConfig
+from core import Simulation
+from settings import *
+
+
+def _runs(engine: str, output: str = SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY, seed: int = 3):
+    # A small population saturates well before the last day.
+    config = SimulationConfig.from_environment(population=200)
+    runs = {}
+    for early_stop in [True, False]:
+        simulation = Simulation.from_engine(engine=engine, days=40, risky_interactions=0.3, seed=seed, output=output,
+                                            config=config, early_stop=early_stop)
+        runs[early_stop] = simulation.run(), simulation.metadata
+    return runs
+
+
+@pytest.mark.parametrize("engine", SOCIAL_DISTANCING_VAR_ENGINES)
+def test_interactions_are_not_recorded_after_the_stop(engine):
+    runs = _runs(engine)
+    (_, stopped), metadata = runs[True]
+    (_, full), _ = runs[False]
+    assert metadata["stopped_at"] is not None
+    simulated = stopped["time"] <= metadata["stopped_at"] - metadata["stopped_at"] % 100
+    assert (stopped["interactions_total"][~simulated] == -1).all()
+    for column in ["group", "interactions_total", "interactions_risky", "infected"]:
+        kept = stopped[column] >= 0
+        np.testing.assert_array_equal(stopped[column][kept], full[column][kept])
+
+
+@pytest.mark.parametrize("engine", SOCIAL_DISTANCING_VAR_ENGINES)
+@pytest.mark.parametrize("output", [SOCIAL_DISTANCING_TAG_OUTPUT_RAW, SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY])
+def test_early_stop_keeps_the_confirmed_series(engine, output):
+    runs = _runs(engine, output=output)
+    (stopped, _), metadata = runs[True]
+    (full, _), _ = runs[False]
+    assert metadata["stopped_at"] is not None
+    pd.testing.assert_frame_equal(pd.DataFrame(stopped), pd.DataFrame(full))
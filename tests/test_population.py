@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from config import SimulationConfig
+from models.place import PlaceFactory
+from models.population import Population
+from settings import *
+
+
+def test_snapshot_loads_with_its_config(tmp_path):
+    config = SimulationConfig.from_environment(strategy=SOCIAL_DISTANCING_TAG_STRATEGY_DISTANCING, population=500)
+    population = Population.create(rng=np.random.default_rng(0), config=config).save(str(tmp_path))
+    loaded = Population.load(str(tmp_path), config=config)
+    assert loaded.groups == population.groups
+    np.testing.assert_array_equal(loaded.places, population.places)
+
+
+def test_snapshot_rejects_another_strategy(tmp_path):
+    config = SimulationConfig.from_environment(strategy=SOCIAL_DISTANCING_TAG_STRATEGY_DISTANCING, population=500)
+    Population.create(rng=np.random.default_rng(0), config=config).save(str(tmp_path))
+    with pytest.raises(ValueError):
+        Population.load(str(tmp_path), config=config.replace(strategy=SOCIAL_DISTANCING_TAG_STRATEGY_INTERACTING))
+
+
+def test_configs_own_their_place_factories():
+    configs = [SimulationConfig.from_environment(population=population) for population in [100, 1000]]
+    factories = [config.place_factories for config in configs]
+    assert factories[0]["home"] is not factories[1]["home"]
+    assert factories[0]["home"].n_options == configs[0].factory_sizes["home"]
+    assert not any(factory in PlaceFactory.VALUES.values() for config in factories for factory in config.values())
@@ -0,0 +1,54 @@
+import collections
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog import ResultCatalog
+from config import SimulationConfig
+from core import Simulation, Simulator
+from settings import *
+from storage import read_daily_infected_cases
+
+
+@pytest.mark.parametrize("engine", SOCIAL_DISTANCING_VAR_ENGINES)
+@pytest.mark.parametrize("output", [SOCIAL_DISTANCING_TAG_OUTPUT_RAW, SOCIAL_DISTANCING_TAG_OUTPUT_SUMMARY])
+def test_event_driven_matches_every_tick(engine, output):
+    config = SimulationConfig.from_environment(population=300)
+    results = []
+    for event_driven in [True, False]:
+        simulation = Simulation.from_engine(engine=engine, days=6, risky_interactions=0.1, seed=4, output=output,
+                                            config=config, event_driven=event_driven, early_stop=False)
+        results.append([pd.DataFrame(records) for records in simulation.run()])
+    for event_driven, every_tick in zip(*results):
+        pd.testing.assert_frame_equal(event_driven, every_tick)
+
+
+def _daily_infected_cases(path: str) -> dict:
+    # Seed -> daily infected cases of every cataloged run; a batch file holds its runs sorted by run id.
+    files = collections.defaultdict(list)
+    for run in ResultCatalog(path).runs():
+        files[run["confirmed_path"]].append(run)
+    return {
+        run["seed"]: daily
+        for confirmed_path, runs in files.items()
+        for run, daily in zip(sorted(runs, key=lambda run: run["run_id"]),
+                              read_daily_infected_cases(os.path.join(path, confirmed_path)))
+    }
+
+
+def test_a_seed_gives_the_same_runs_on_every_backend_and_batch_size(tmp_path):
+    config = SimulationConfig.from_environment(population=200)
+    runs = []
+    for backend, batch_size in [(SOCIAL_DISTANCING_TAG_BACKEND_THREAD, 1), (SOCIAL_DISTANCING_TAG_BACKEND_THREAD, 3),
+                                (SOCIAL_DISTANCING_TAG_BACKEND_PROCESS, 2)]:
+        path = str(tmp_path / f"{backend}-{batch_size}")
+        Simulator(simulations=4, njobs=2, backend=backend, cache=False, batch_size=batch_size, config=config,
+                  output_format="csv").run(days=5, risky_interactions=0.1, output_path=path, seed=9)
+        runs.append(_daily_infected_cases(path))
+    assert len(runs[0]) == 4
+    for other in runs[1:]:
+        assert other.keys() == runs[0].keys()
+        for seed, daily in runs[0].items():
+            np.testing.assert_array_equal(other[seed], daily)
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import core
+from config import SimulationConfig
+from core import Simulator
+from settings import *
+from sweep import Sweep
+from utils import spawn_seeds
+
+
+def _flaky(path: str, always: int = 3):
+    # Engine failing the first attempt of every run (attempts are marked on files: retries may land on another
+    # process) and every attempt of the runs whose seed is a multiple of "always".
+    engine = core.Simulation.from_engine
+
+    def from_engine(**kwargs):
+        marker = os.path.join(path, str(kwargs["seed"]))
+        if kwargs["seed"] % always == 0 or not os.path.exists(marker):
+            open(marker, "w").close()
+            raise RuntimeError("Flaky engine")
+        return engine(**kwargs)
+    return from_engine
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+@pytest.mark.parametrize("backend", SOCIAL_DISTANCING_VAR_BACKENDS)
+@pytest.mark.parametrize("retries", [0, 2])
+def test_failed_runs_are_retried_and_reported(tmp_path, monkeypatch, adaptive, backend, retries):
+    os.makedirs(tmp_path / "attempts")
+    monkeypatch.setattr(core.Simulation, "from_engine", _flaky(str(tmp_path / "attempts")))
+    simulator = Simulator(simulations=2 if adaptive else 8, njobs=2, backend=backend, cache=False, output_format="csv",
+                          config=SimulationConfig.from_environment(population=100), retries=retries)
+    arguments = {"days": 2, "output_path": str(tmp_path / "runs"), "seed": 5}
+    if adaptive:
+        # A tolerance of 0 is never met: every run is simulated.
+        simulator.run_adaptive(tolerance=0, max_simulations=8, **arguments)
+    else:
+        simulator.run(**arguments)
+    summary = simulator.metrics.summary()
+    always = sum(seed % 3 == 0 for seed in spawn_seeds(seed=5, n=8))
+    assert 0 < always < 8
+    if retries:
+        assert (summary["completed"], summary["failed"], summary["retried"]) == (8 - always, always, 8 + always)
+    else:
+        assert (summary["completed"], summary["failed"], summary["retried"]) == (0, 8, 0)
+
+
+def test_sweep_retries_its_failed_runs(tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "attempts")
+    # No run always fails: seeds are below 2 ** 64.
+    monkeypatch.setattr(core.Simulation, "from_engine", _flaky(str(tmp_path / "attempts"), always=2 ** 64))
+    sweep = Sweep(Sweep.grid(population=[100, 200]), days=2, replicates=2, njobs=2,
+                  backend=SOCIAL_DISTANCING_TAG_BACKEND_PROCESS, cache=False, output_format="csv", retries=1)
+    summary = sweep.run(str(tmp_path / "sweep"), seed=3)
+    assert (summary["simulated"], summary["failed"], summary["retried"]) == (4, 0, 4)
+    assert len(Sweep.completed(str(tmp_path / "sweep"))) == 4
@@ -0,0 +1,16 @@
+import pytest
+
+from config import SimulationConfig
+from core import Simulation
+from settings import *
+
+
+@pytest.mark.parametrize("engine", SOCIAL_DISTANCING_VAR_ENGINES)
+@pytest.mark.parametrize("history_days", [0, 2, -1])
+def test_route_history_keeps_the_last_days(engine, history_days):
+    config = SimulationConfig.from_environment(population=200)
+    simulation = Simulation.from_engine(engine=engine, days=4, seed=5, config=config, history_days=history_days,
+                                        early_stop=False)
+    simulation.run()
+    days = {0: 0, 2: 2, -1: 4}[history_days]
+    assert simulation.route_history.shape == (days, len(simulation.population))
@@ -0,0 +1,61 @@
+import numpy as np
+
+from stats import ConvergenceCriterion, RunningStats, critical_value
+
+
+def test_quantiles_are_not_clipped_to_the_initial_range():
+    values = np.random.default_rng(0).integers(0, 3001, size=(500, 3))
+    stats = RunningStats(quantile_bins=1000)
+    for row in values:
+        stats.update(row)
+    # Bins are 4 cases wide once the range grew over 3000.
+    assert stats.upper >= values.max()
+    np.testing.assert_allclose(stats.quantile(0.9), np.quantile(values, 0.9, axis=0), atol=30)
+    np.testing.assert_allclose(stats.quantile(1), values.max(axis=0), atol=4)
+
+
+def test_merged_sketches_match_a_single_sketch():
+    values = np.random.default_rng(1).integers(0, 3001, size=(200, 2))
+    values[:100] //= 10
+    single, first, second = RunningStats(quantile_bins=100), RunningStats(quantile_bins=100), \
+        RunningStats(quantile_bins=100)
+    for row in values:
+        single.update(row)
+    for row in values[:100]:
+        first.update(row)
+    for row in values[100:]:
+        second.update(row)
+    first.merge(second)
+    assert first.upper == single.upper
+    np.testing.assert_array_equal(first.histogram, single.histogram)
+    np.testing.assert_allclose(first.mean, single.mean)
+
+
+def test_normal_critical_values():
+    for confidence, value in [(0.9, 1.644854), (0.95, 1.959964), (0.99, 2.575829)]:
+        assert abs(critical_value(confidence) - value) < 1e-6
+
+
+def test_student_critical_values():
+    for df, value in [(1, 12.7062), (2, 4.3027), (9, 2.2622), (30, 2.0423), (100, 1.9840), (1000, 1.9623)]:
+        assert abs(critical_value(0.95, df) - value) < 1e-4
+
+
+def test_two_close_runs_do_not_converge():
+    # A normal interval (1.96 standard errors) would already be 2 wide; Student's t with one degree of freedom is 12.7.
+    criterion = ConvergenceCriterion(tolerance=5, min_runs=2)
+    criterion.update(np.array([0.0])).update(np.array([2.0]))
+    assert not criterion.converged
+
+
+def test_stopping_rule_needs_enough_runs():
+    # Runs with a standard deviation of 10 need about 16 of them for a 95% half width of 5.
+    rng = np.random.default_rng(0)
+    runs = []
+    for _ in range(300):
+        criterion = ConvergenceCriterion(tolerance=5, min_runs=2)
+        while not criterion.converged:
+            criterion.update(rng.normal(100, 10, size=1))
+        runs.append(criterion.runs)
+    assert np.mean(np.array(runs) == 2) < 0.1
+    assert np.median(runs) >= 12
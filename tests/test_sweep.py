@@ -0,0 +1,22 @@
+import os
+
+from catalog import ResultCatalog
+from settings import *
+from sweep import Sweep
+
+
+def _sweep(early_stop: bool = True) -> Sweep:
+    return Sweep(Sweep.grid(population=[100, 200]), days=3, replicates=2, njobs=1,
+                 backend=SOCIAL_DISTANCING_TAG_BACKEND_THREAD, cache=False, output_format="csv", early_stop=early_stop)
+
+
+def test_sweep_runs_are_saved_once(tmp_path):
+    path = str(tmp_path)
+    summary = _sweep().run(path, seed=2)
+    assert (summary["runs"], summary["simulated"], summary["failed"]) == (4, 4, 0)
+    runs = ResultCatalog(path).runs()
+    assert sorted(run["run_id"] for run in runs) == sorted(Sweep.completed(path))
+    assert all(os.path.exists(os.path.join(path, run["confirmed_path"])) for run in runs)
+    assert _sweep().run(path, seed=2)["skipped"] == 4
+    # Runs without early stop record other interactions: they aren't the same runs.
+    assert _sweep(early_stop=False).run(path, seed=2)["simulated"] == 4
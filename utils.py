@@ -1,4 +1,10 @@
+import hashlib
+import json
 import os
+import random
+from typing import List, Optional
+
+import numpy as np
 
 
 def list_dir(path="."):
@@ -35,5 +41,21 @@ def flatten_dict(dictionary, sep=".", prefix=""):
 
 
 def get_dict_hash_key(dictionary, sep=".", prefix=""):
+    # Content hash, stable across interpreter runs (unlike the salted built-in hash).
     flatten_dictionary = flatten_dict(_replace_list_elements(dictionary), sep, prefix)
-    return hash(frozenset(flatten_dictionary.items()))
+    content = json.dumps(flatten_dictionary, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def sample_pairs(population, k, rng: random.Random = random):
+    # Equivalent to random.choices(tuple(itertools.combinations(population, r=2)), k=k) without listing every pair.
+    n = len(population)
+    for _ in range(k):
+        i = rng.randrange(n)
+        j = rng.randrange(n - 1)
+        yield population[i], population[j + 1 if j >= i else j]
+
+
+def spawn_seeds(seed: Optional[int], n: int) -> List[int]:
+    # Independent child streams of a master seed (fresh entropy when None), safe to use on parallel workers.
+    return [int(child.generate_state(1, np.uint64)[0]) for child in np.random.SeedSequence(seed).spawn(n)]
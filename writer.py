@@ -0,0 +1,89 @@
+import logging
+import queue
+import threading
+from typing import Callable, Dict, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+
+class ResultWriter:
+    # Background stage writing the results of the runs in batches of "batch_size" runs (per key): one thread groups
+    # the runs and "threads" threads write the batches (slow or remote storage writes several files at once).
+    # Producers only block while "max_pending" runs are already waiting to be written (backpressure), so workers go on
+    # simulating.
+    _DONE = object()
+
+    def __init__(self, save: Callable[[Hashable, List[tuple]], None], batch_size: int = 1, max_pending: int = 64,
+                 threads: int = 1):
+        self.save = save
+        self.batch_size = max(batch_size, 1)
+        self.threads = max(threads, 1)
+        self.queue = queue.Queue(maxsize=max(max_pending, self.batch_size))
+        # Complete batches waiting for a writing thread.
+        self.batches = queue.Queue(maxsize=self.threads)
+        self.written = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def __repr__(self):
+        return f"ResultWriter(written={self.written}, failed={self.failed}, pending={self.queue.qsize()})"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(raise_errors=exc_type is None)
+
+    def start(self) -> 'ResultWriter':
+        self._threads = [threading.Thread(target=self._batch, name="result-writer-batch", daemon=True)] + [
+            threading.Thread(target=self._write, name=f"result-writer-{i}", daemon=True) for i in range(self.threads)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, key: Hashable, run: tuple):
+        self.queue.put((key, run))
+
+    def _batch(self):
+        batches: Dict[Hashable, List[tuple]] = {}
+        while True:
+            entry = self.queue.get()
+            if entry is self._DONE:
+                break
+            key, run = entry
+            batches.setdefault(key, []).append(run)
+            if len(batches[key]) >= self.batch_size:
+                self.batches.put((key, batches.pop(key)))
+        for key, runs in batches.items():
+            self.batches.put((key, runs))
+        for _ in range(self.threads):
+            self.batches.put(self._DONE)
+
+    def _write(self):
+        # A failed write is logged and counted: the rest of the results are still written.
+        while True:
+            entry = self.batches.get()
+            if entry is self._DONE:
+                break
+            key, runs = entry
+            try:
+                self.save(key, runs)
+                with self._lock:
+                    self.written += len(runs)
+            except Exception:
+                logger.exception(f"Writing {len(runs)} runs ({key}) failed")
+                with self._lock:
+                    self.failed += len(runs)
+
+    def close(self, raise_errors: bool = True):
+        # Writes what is left (incomplete batches included) and waits for the writer to finish.
+        if not self._threads:
+            return
+        self.queue.put(self._DONE)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if raise_errors and self.failed:
+            raise IOError(f"Results of {self.failed} runs couldn't be written, see the log")